@@ -1,26 +1,48 @@
 #!/usr/bin/env python3
-import curses
-import curses.ascii
-import curses.textpad
+import base64
 import csv
+import gzip
+import decimal
+import io
+import itertools
 import json
 import os
+import queue
+import re
+import shutil
+import struct
 import subprocess
 import sys
+import threading
 import traceback
 import time
-from datetime import datetime
+import types
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from contextlib import contextmanager
+from datetime import date, datetime, time as time_of_day
 
 try:
     import pyodbc
 except Exception:
     pyodbc = None
 
+# curses so e carregado no modo interativo (load_curses); os comandos sem interface nao o usam
+curses = None
+
+try:
+    import zstandard
+except Exception:
+    zstandard = None
+
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 CONFIG_DIR = os.path.join(os.path.expanduser("~"), ".config", "jupyter-ssms")
 LOG_DIR = os.path.join(os.path.expanduser("~"), ".local", "share", "jupyter-ssms")
 CONFIG_PATH = os.path.join(CONFIG_DIR, "config.json")
+MIRROR_STATE_PATH = os.path.join(CONFIG_DIR, "mirror_state.json")
 LOG_PATH = os.path.join(LOG_DIR, "jupyter_ssms.log")
+MIRROR_STATS_PATH = os.path.join(LOG_DIR, "mirror_stats.json")
+MIRROR_METRICS_PATH = os.path.join(LOG_DIR, "mirror_metrics.jsonl")
 VERSION = "Io v2.06022026"
 FOCUS_ATTR = 0
 
@@ -35,6 +57,54 @@ DEFAULT_CONFIG = {
     "remember": True,
     "save_password": False,
     "history": [],
+    "mirror": {
+        "incremental": False,
+        "exact_count": False,
+        "copy_indexes": True,
+        "clustered_before_load": False,
+        "index_workers": 1,
+        "index_maxdop": 0,
+        "sort_in_tempdb": False,
+        "bulk_load": False,
+        "commit_batches": 50,
+        "fk_order": True,
+        "parallel_tables": 1,
+        "follow_fks": False,
+        "lob_batch_mb": 64,
+        "lob_chunk_mb": 8,
+        "max_rss_mb": 0,
+        "swap_load": False,
+        "passthrough_types": True,
+        "consistent_reads": "off",
+    },
+    "export": {
+        "insert_batch_rows": 1000,
+    },
+}
+
+MIRROR_OPTION_FIELDS = [
+    ("Incremental (rowversion/Change Tracking)", "incremental", "bool"),
+    ("Contagem exata (COUNT_BIG, lento)", "exact_count", "bool"),
+    ("Copiar indices e constraints", "copy_indexes", "bool"),
+    ("Criar indice clustered antes da carga", "clustered_before_load", "bool"),
+    ("Indices em paralelo (conexoes)", "index_workers", "int"),
+    ("MAXDOP dos indices (0 = padrao)", "index_maxdop", "int"),
+    ("SORT_IN_TEMPDB", "sort_in_tempdb", "bool"),
+    ("Carga bulk (TABLOCK + transacoes)", "bulk_load", "bool"),
+    ("Lotes por transacao (carga bulk)", "commit_batches", "int"),
+    ("Ordenar por foreign keys", "fk_order", "bool"),
+    ("Tabelas em paralelo (por nivel de FK)", "parallel_tables", "int"),
+    ("Filtros seguem FKs (filhas das linhas filtradas)", "follow_fks", "bool"),
+    ("Lote maximo em MB (tabelas com LOB)", "lob_batch_mb", "int"),
+    ("LOB em partes acima de N MB (0 = nunca)", "lob_chunk_mb", "int"),
+    ("Limite de memoria RSS em MB (0 = sem)", "max_rss_mb", "int"),
+    ("Carga em tabela nova + troca (sem downtime)", "swap_load", "bool"),
+    ("Decimal/data/GUID sem objetos Python (texto/binario)", "passthrough_types", "bool"),
+    ("Leitura consistente (off/snapshot/db_snapshot)", "consistent_reads", "choice"),
+]
+
+MIRROR_OPTION_CHOICES = {
+    "consistent_reads": ["off", "snapshot", "db_snapshot"],
 }
 
 
@@ -66,6 +136,8 @@ def load_config():
             cfg["history"] = []
         if not cfg.get("database"):
             cfg["database"] = "master"
+        cfg["mirror"] = mirror_options(cfg)
+        cfg["export"] = export_options(cfg)
         # nunca preenche host/usuario automaticamente
         cfg["host"] = ""
         cfg["user"] = ""
@@ -84,6 +156,82 @@ def save_config(cfg):
         log_event(f"Erro salvando config: {e}")
 
 
+def mirror_options(cfg):
+    options = dict(DEFAULT_CONFIG["mirror"])
+    if isinstance(cfg.get("mirror"), dict):
+        options.update(cfg["mirror"])
+    return options
+
+
+def export_options(cfg):
+    options = dict(DEFAULT_CONFIG["export"])
+    if isinstance(cfg.get("export"), dict):
+        options.update(cfg["export"])
+    return options
+
+
+def load_mirror_state():
+    try:
+        with open(MIRROR_STATE_PATH, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except Exception:
+        return {}
+
+
+def save_mirror_state(state):
+    try:
+        os.makedirs(CONFIG_DIR, exist_ok=True)
+        tmp_path = MIRROR_STATE_PATH + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, MIRROR_STATE_PATH)
+    except Exception as e:
+        log_event(f"Erro salvando estado do espelho: {e}")
+
+
+def mirror_state_key(origin_label, origin_db, dest_label, dest_db, table):
+    return f"{origin_label}/{origin_db} -> {dest_label}/{dest_db} :: {table}"
+
+
+def load_mirror_stats():
+    try:
+        with open(MIRROR_STATS_PATH, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, list) else []
+    except Exception:
+        return []
+
+
+def record_mirror_run(origin_label, dest_label, bytes_copied, rows, seconds, max_items=50):
+    runs = load_mirror_stats()
+    runs.append(
+        {
+            "ts": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "origin": origin_label,
+            "dest": dest_label,
+            "bytes": int(bytes_copied),
+            "rows": int(rows),
+            "seconds": round(seconds, 3),
+        }
+    )
+    try:
+        os.makedirs(LOG_DIR, exist_ok=True)
+        with open(MIRROR_STATS_PATH, "w", encoding="utf-8") as f:
+            json.dump(runs[-max_items:], f, indent=2, ensure_ascii=False)
+    except Exception as e:
+        log_event(f"Erro salvando historico de throughput: {e}")
+
+
+def append_mirror_metrics(record):
+    try:
+        os.makedirs(LOG_DIR, exist_ok=True)
+        with open(MIRROR_METRICS_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    except Exception as e:
+        log_event(f"Erro gravando metricas do espelho: {e}")
+
+
 def safe_addstr(win, y, x, text, attr=0):
     try:
         win.addstr(y, x, text, attr)
@@ -228,33 +376,74 @@ def delete_forward_at_cursor(box):
     except curses.error:
         pass
 
+TOOL_PATHS = {}
+CLIPBOARD_PASTE_COMMANDS = [
+    ["wl-paste", "-n"],
+    ["xclip", "-selection", "clipboard", "-o"],
+    ["xsel", "--clipboard", "--output"],
+]
+CLIPBOARD_COPY_COMMANDS = [
+    ["wl-copy"],
+    ["xclip", "-selection", "clipboard"],
+    ["xsel", "--clipboard", "--input"],
+]
+CLIPBOARD_TOOLS = {}
+
+def find_tool(name):
+    # Detectado uma vez por processo (shutil.which; sem abrir shell de login)
+    if name not in TOOL_PATHS:
+        TOOL_PATHS[name] = shutil.which(name)
+    return TOOL_PATHS[name]
+
+def clipboard_candidates(kind):
+    # Comando que ja funcionou primeiro; wl-* so em Wayland, xclip/xsel so com DISPLAY
+    cached = CLIPBOARD_TOOLS.get(kind)
+    if cached:
+        return [cached]
+    commands = CLIPBOARD_PASTE_COMMANDS if kind == "paste" else CLIPBOARD_COPY_COMMANDS
+    result = []
+    for cmd in commands:
+        env = "WAYLAND_DISPLAY" if cmd[0].startswith("wl-") else "DISPLAY"
+        path = find_tool(cmd[0])
+        if path and os.environ.get(env):
+            result.append([path] + cmd[1:])
+    return result
+
 def get_clipboard_text():
-    for cmd in (
-        ["wl-paste", "-n"],
-        ["xclip", "-selection", "clipboard", "-o"],
-        ["xsel", "--clipboard", "--output"],
-    ):
+    for cmd in clipboard_candidates("paste"):
         try:
-            proc = subprocess.run(cmd, capture_output=True, text=True, check=True)
+            proc = subprocess.run(cmd, capture_output=True, text=True, encoding="utf-8", errors="replace", check=True, timeout=5)
+            CLIPBOARD_TOOLS["paste"] = cmd
             return proc.stdout or ""
         except Exception:
+            CLIPBOARD_TOOLS.pop("paste", None)
             continue
     return ""
 
 def set_clipboard_text(text):
+    # wl-copy/xclip/xsel ficam em segundo plano servindo a selecao; o texto e
+    # entregue numa thread para uma selecao grande nao travar a interface
     if text is None:
         return False
-    for cmd in (
-        ["wl-copy"],
-        ["xclip", "-selection", "clipboard"],
-        ["xsel", "--clipboard", "--input"],
-    ):
-        try:
-            subprocess.run(cmd, input=text, text=True, check=True)
-            return True
-        except Exception:
-            continue
-    return False
+    candidates = clipboard_candidates("copy")
+    if not candidates:
+        return False
+
+    def copy():
+        for cmd in candidates:
+            try:
+                subprocess.run(
+                    cmd, input=text, text=True, encoding="utf-8", check=True, timeout=30,
+                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                )
+                CLIPBOARD_TOOLS["copy"] = cmd
+                return
+            except Exception:
+                CLIPBOARD_TOOLS.pop("copy", None)
+                continue
+
+    threading.Thread(target=copy, daemon=True).start()
+    return True
 
 
 def draw_header(win, title):
@@ -316,12 +505,27 @@ def build_conn_str(cfg, password):
     return ";".join(parts)
 
 
+SQL_SS_TIMESTAMPOFFSET = -155
+TIMESTAMPOFFSET_STRUCT = struct.Struct("<6hI2h")
+
+def convert_datetimeoffset(value):
+    # SQL_SS_TIMESTAMPOFFSET_STRUCT: ano..segundo, fracao em ns, fuso (horas, minutos)
+    y, mo, d, h, mi, sec, frac, tz_h, tz_m = TIMESTAMPOFFSET_STRUCT.unpack(value)
+    sign = "-" if tz_h < 0 or tz_m < 0 else "+"
+    text = f"{y:04d}-{mo:02d}-{d:02d} {h:02d}:{mi:02d}:{sec:02d}"
+    if frac:
+        text += f".{frac // 100:07d}"
+    return f"{text} {sign}{abs(tz_h):02d}:{abs(tz_m):02d}"
+
 def connect_db(cfg, password):
     if pyodbc is None:
         return None, "pyodbc nao instalado"
     try:
         conn_str = build_conn_str(cfg, password)
         conn = pyodbc.connect(conn_str, timeout=5, autocommit=True)
+        # DATETIMEOFFSET nao tem conversao nativa no pyodbc (a leitura falhava); vale para a
+        # conexao inteira: grid, exportacoes e salvar em tabela recebem o texto com o fuso
+        conn.add_output_converter(SQL_SS_TIMESTAMPOFFSET, convert_datetimeoffset)
         return conn, None
     except Exception as e:
         return None, str(e)
@@ -382,6 +586,88 @@ def fetch_columns_detail(conn, schema, table):
     cur.execute(sql, (obj,))
     return cur.fetchall()
 
+def fetch_table_sizes(conn):
+    # Estimativa via metadados (sem varrer as tabelas):
+    # {"schema.tabela": {"rows", "reserved_kb", "data_kb", "lob_kb"}} (data/lob so do heap/clustered)
+    sql = """
+    SELECT s.name, t.name,
+        SUM(CASE WHEN ps.index_id IN (0, 1) THEN ps.row_count ELSE 0 END),
+        SUM(ps.reserved_page_count) * 8,
+        SUM(CASE WHEN ps.index_id IN (0, 1) THEN ps.in_row_data_page_count ELSE 0 END) * 8,
+        SUM(CASE WHEN ps.index_id IN (0, 1) THEN ps.lob_used_page_count + ps.row_overflow_used_page_count ELSE 0 END) * 8
+    FROM sys.dm_db_partition_stats ps
+    JOIN sys.tables t ON t.object_id = ps.object_id
+    JOIN sys.schemas s ON s.schema_id = t.schema_id
+    GROUP BY s.name, t.name
+    """
+    fallback_sql = """
+    SELECT s.name, t.name,
+        SUM(CASE WHEN p.index_id IN (0, 1) THEN p.rows ELSE 0 END),
+        0, 0, 0
+    FROM sys.partitions p
+    JOIN sys.tables t ON t.object_id = p.object_id
+    JOIN sys.schemas s ON s.schema_id = t.schema_id
+    GROUP BY s.name, t.name
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute(sql)
+    except Exception:
+        # sem VIEW DATABASE STATE: so as linhas
+        cur.execute(fallback_sql)
+    sizes = {}
+    for schema, table, rows, reserved_kb, data_kb, lob_kb in cur.fetchall():
+        sizes[f"{schema}.{table}"] = {
+            "rows": int(rows or 0),
+            "reserved_kb": int(reserved_kb or 0),
+            "data_kb": int(data_kb or 0),
+            "lob_kb": int(lob_kb or 0),
+        }
+    return sizes
+
+def fetch_all_column_names(conn):
+    sql = """
+    SELECT TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME
+    FROM INFORMATION_SCHEMA.COLUMNS
+    """
+    cur = conn.cursor()
+    cur.execute(sql)
+    cols = {}
+    for schema, table, col in cur.fetchall():
+        cols.setdefault(f"{schema}.{table}", set()).add(col.lower())
+    return cols
+
+def fetch_free_space_kb(conn):
+    sql = """
+    SELECT SUM(CAST(size - FILEPROPERTY(name, 'SpaceUsed') AS bigint)) * 8
+    FROM sys.database_files
+    WHERE type = 0
+    """
+    try:
+        row = conn.execute(sql).fetchone()
+        return int(row[0]) if row and row[0] is not None else None
+    except Exception:
+        return None
+
+def fetch_recovery_model(conn):
+    try:
+        row = conn.execute("SELECT recovery_model_desc FROM sys.databases WHERE database_id = DB_ID()").fetchone()
+        return row[0] if row else None
+    except Exception:
+        return None
+
+def fetch_log_usage(conn):
+    # (bytes usados, tamanho total) do log do database atual
+    try:
+        row = conn.execute(
+            "SELECT used_log_space_in_bytes, total_log_size_in_bytes FROM sys.dm_db_log_space_usage"
+        ).fetchone()
+    except Exception:
+        return None
+    if row is None:
+        return None
+    return int(row[0]), int(row[1])
+
 def table_exists(conn, schema, table):
     sql = """
     SELECT 1
@@ -401,9 +687,60 @@ def schema_exists(conn, schema):
 def ensure_schema(conn, schema):
     if schema_exists(conn, schema):
         return
-    conn.execute(f"CREATE SCHEMA [{schema}]")
+    try:
+        conn.execute(f"CREATE SCHEMA [{schema}]")
+    except Exception:
+        # outra conexao (copia em paralelo) pode ter criado o schema
+        if not schema_exists(conn, schema):
+            raise
+
+def fetch_primary_key(conn, schema, table):
+    sql = """
+    SELECT c.name
+    FROM sys.indexes i
+    JOIN sys.index_columns ic
+        ON ic.object_id = i.object_id AND ic.index_id = i.index_id
+    JOIN sys.columns c
+        ON c.object_id = ic.object_id AND c.column_id = ic.column_id
+    WHERE i.object_id = OBJECT_ID(?) AND i.is_primary_key = 1
+    ORDER BY ic.key_ordinal
+    """
+    obj = f"{schema}.{table}"
+    cur = conn.cursor()
+    cur.execute(sql, (obj,))
+    return [r[0] for r in cur.fetchall()]
 
-def build_column_type(col):
+def fetch_change_tracking_versions(conn, schema, table):
+    # (versao atual, versao minima valida) ou None se a tabela nao tem Change Tracking
+    sql = """
+    SELECT CHANGE_TRACKING_CURRENT_VERSION(), CHANGE_TRACKING_MIN_VALID_VERSION(ct.object_id)
+    FROM sys.change_tracking_tables ct
+    WHERE ct.object_id = OBJECT_ID(?)
+    """
+    obj = f"{schema}.{table}"
+    try:
+        cur = conn.cursor()
+        cur.execute(sql, (obj,))
+        row = cur.fetchone()
+    except Exception:
+        return None
+    if row is None or row[0] is None:
+        return None
+    return int(row[0]), int(row[1] or 0)
+
+def fetch_min_active_rowversion(conn):
+    row = conn.execute("SELECT MIN_ACTIVE_ROWVERSION()").fetchone()
+    return bytes(row[0])
+
+def truncate_table(conn, schema, table):
+    ref = build_table_ref_full(schema, table)
+    try:
+        conn.execute(f"TRUNCATE TABLE {ref}")
+    except Exception:
+        # TRUNCATE falha se a tabela e referenciada por FK
+        conn.execute(f"DELETE FROM {ref}")
+
+def build_column_type(col, identity=True):
     name, data_type, max_length, precision, scale, is_nullable, is_identity, is_computed, seed, inc = col
     dt = data_type.lower()
     type_part = dt
@@ -417,7 +754,10 @@ def build_column_type(col):
         type_part = f"{dt}({precision},{scale})"
     elif dt in ("datetime2", "datetimeoffset", "time"):
         type_part = f"{dt}({scale})"
-    if is_identity:
+    elif dt in ("timestamp", "rowversion"):
+        # rowversion nao aceita valores explicitos; no destino vira binary(8)
+        type_part = "binary(8)"
+    if is_identity and identity:
         seed_val = int(seed) if seed is not None else 1
         inc_val = int(inc) if inc is not None else 1
         type_part += f" IDENTITY({seed_val},{inc_val})"
@@ -437,6 +777,256 @@ def create_table_from_columns(conn, schema, table, columns):
     conn.execute(ddl)
     return True
 
+def fetch_index_definitions(conn, schema, table):
+    sql = """
+    SELECT
+        i.index_id,
+        i.name,
+        i.type,
+        i.is_unique,
+        i.is_primary_key,
+        i.is_unique_constraint,
+        i.fill_factor,
+        i.filter_definition,
+        c.name,
+        ic.key_ordinal,
+        ic.is_descending_key,
+        ic.is_included_column
+    FROM sys.indexes i
+    JOIN sys.index_columns ic
+        ON ic.object_id = i.object_id AND ic.index_id = i.index_id
+    JOIN sys.columns c
+        ON c.object_id = ic.object_id AND c.column_id = ic.column_id
+    WHERE i.object_id = OBJECT_ID(?) AND i.type IN (1, 2) AND i.is_hypothetical = 0
+    ORDER BY i.index_id, ic.key_ordinal, ic.index_column_id
+    """
+    obj = f"{schema}.{table}"
+    cur = conn.cursor()
+    cur.execute(sql, (obj,))
+    indexes = {}
+    for index_id, name, itype, is_unique, is_pk, is_uq, fill_factor, filt, col, key_ordinal, desc, included in cur.fetchall():
+        ix = indexes.get(index_id)
+        if ix is None:
+            ix = {
+                "name": name,
+                "clustered": itype == 1,
+                "unique": bool(is_unique),
+                "primary_key": bool(is_pk),
+                "unique_constraint": bool(is_uq),
+                "fill_factor": int(fill_factor or 0),
+                "filter": filt,
+                "keys": [],
+                "include": [],
+            }
+            indexes[index_id] = ix
+        if included:
+            ix["include"].append(col)
+        elif key_ordinal:
+            ix["keys"].append((col, bool(desc)))
+    return [ix for ix in indexes.values() if ix["keys"]]
+
+def fetch_default_constraints(conn, schema, table):
+    sql = """
+    SELECT dc.name, c.name, dc.definition
+    FROM sys.default_constraints dc
+    JOIN sys.columns c
+        ON c.object_id = dc.parent_object_id AND c.column_id = dc.parent_column_id
+    WHERE dc.parent_object_id = OBJECT_ID(?)
+    """
+    obj = f"{schema}.{table}"
+    cur = conn.cursor()
+    cur.execute(sql, (obj,))
+    return cur.fetchall()
+
+def fetch_check_constraints(conn, schema, table):
+    sql = """
+    SELECT cc.name, cc.definition
+    FROM sys.check_constraints cc
+    WHERE cc.parent_object_id = OBJECT_ID(?) AND cc.is_disabled = 0
+    """
+    obj = f"{schema}.{table}"
+    cur = conn.cursor()
+    cur.execute(sql, (obj,))
+    return cur.fetchall()
+
+def fetch_foreign_key_graph(conn):
+    # Arestas (filha, pai) de todas as FKs do database atual, em uma consulta
+    sql = """
+    SELECT ps.name, pt.name, rs.name, rt.name
+    FROM sys.foreign_keys fk
+    JOIN sys.tables pt ON pt.object_id = fk.parent_object_id
+    JOIN sys.schemas ps ON ps.schema_id = pt.schema_id
+    JOIN sys.tables rt ON rt.object_id = fk.referenced_object_id
+    JOIN sys.schemas rs ON rs.schema_id = rt.schema_id
+    """
+    cur = conn.cursor()
+    cur.execute(sql)
+    return [(f"{r[0]}.{r[1]}", f"{r[2]}.{r[3]}") for r in cur.fetchall()]
+
+def fetch_foreign_keys(conn, schema, table):
+    sql = """
+    SELECT
+        fk.name,
+        rs.name,
+        rt.name,
+        pc.name,
+        rc.name,
+        fk.delete_referential_action_desc,
+        fk.update_referential_action_desc
+    FROM sys.foreign_keys fk
+    JOIN sys.foreign_key_columns fkc ON fkc.constraint_object_id = fk.object_id
+    JOIN sys.tables rt ON rt.object_id = fk.referenced_object_id
+    JOIN sys.schemas rs ON rs.schema_id = rt.schema_id
+    JOIN sys.columns pc
+        ON pc.object_id = fkc.parent_object_id AND pc.column_id = fkc.parent_column_id
+    JOIN sys.columns rc
+        ON rc.object_id = fkc.referenced_object_id AND rc.column_id = fkc.referenced_column_id
+    WHERE fk.parent_object_id = OBJECT_ID(?) AND fk.is_disabled = 0
+    ORDER BY fk.name, fkc.constraint_column_id
+    """
+    obj = f"{schema}.{table}"
+    cur = conn.cursor()
+    cur.execute(sql, (obj,))
+    fks = {}
+    for name, ref_schema, ref_table, col, ref_col, on_delete, on_update in cur.fetchall():
+        fk = fks.setdefault(
+            name,
+            {
+                "name": name,
+                "ref_schema": ref_schema,
+                "ref_table": ref_table,
+                "cols": [],
+                "ref_cols": [],
+                "on_delete": (on_delete or "NO_ACTION").replace("_", " "),
+                "on_update": (on_update or "NO_ACTION").replace("_", " "),
+            },
+        )
+        fk["cols"].append(col)
+        fk["ref_cols"].append(ref_col)
+    return list(fks.values())
+
+def build_index_options(options, fill_factor=0):
+    parts = []
+    if options.get("sort_in_tempdb"):
+        parts.append("SORT_IN_TEMPDB = ON")
+    maxdop = int(options.get("index_maxdop") or 0)
+    if maxdop > 0:
+        parts.append(f"MAXDOP = {maxdop}")
+    if fill_factor:
+        parts.append(f"FILLFACTOR = {fill_factor}")
+    return f" WITH ({', '.join(parts)})" if parts else ""
+
+def build_index_ddl(schema, table, ix, options):
+    ref = build_table_ref_full(schema, table)
+    keys = ", ".join(f"[{c}] {'DESC' if desc else 'ASC'}" for c, desc in ix["keys"])
+    kind = "CLUSTERED" if ix["clustered"] else "NONCLUSTERED"
+    with_opts = build_index_options(options, ix.get("fill_factor"))
+    if ix["primary_key"] or ix["unique_constraint"]:
+        ctype = "PRIMARY KEY" if ix["primary_key"] else "UNIQUE"
+        return f"ALTER TABLE {ref} ADD CONSTRAINT [{ix['name']}] {ctype} {kind} ({keys}){with_opts}"
+    unique = "UNIQUE " if ix["unique"] else ""
+    sql = f"CREATE {unique}{kind} INDEX [{ix['name']}] ON {ref} ({keys})"
+    if ix["include"]:
+        sql += " INCLUDE (" + ", ".join(f"[{c}]" for c in ix["include"]) + ")"
+    if ix["filter"]:
+        sql += f" WHERE {ix['filter']}"
+    return sql + with_opts
+
+def build_foreign_key_ddl(schema, table, fk):
+    cols = ", ".join(f"[{c}]" for c in fk["cols"])
+    ref_cols = ", ".join(f"[{c}]" for c in fk["ref_cols"])
+    ref = build_table_ref_full(fk["ref_schema"], fk["ref_table"])
+    return (
+        f"ALTER TABLE {build_table_ref_full(schema, table)} WITH CHECK ADD CONSTRAINT [{fk['name']}] "
+        f"FOREIGN KEY ({cols}) REFERENCES {ref} ({ref_cols}) "
+        f"ON DELETE {fk['on_delete']} ON UPDATE {fk['on_update']}"
+    )
+
+def script_table_ddl(conn, schema, table, options, target=None, name_suffix=""):
+    # Separa o DDL por fase: antes da carga (defaults e, opcionalmente, o clustered)
+    # e depois da carga (clustered, secundarios, checks e FKs).
+    # target/name_suffix geram o DDL para outra tabela (troca atomica): nomes de constraint
+    # sao unicos no schema, entao ganham o sufixo e voltam ao original via ddl["renames"].
+    target = target or table
+    ref = build_table_ref_full(schema, target)
+    ddl = {"pre_load": [], "clustered": [], "secondary": [], "constraints": [], "foreign_keys": [], "renames": []}
+
+    def constraint_name(name):
+        if name_suffix:
+            ddl["renames"].append((name + name_suffix, name))
+        return name + name_suffix
+
+    for name, col, definition in fetch_default_constraints(conn, schema, table):
+        ddl["pre_load"].append(f"ALTER TABLE {ref} ADD CONSTRAINT [{constraint_name(name)}] DEFAULT {definition} FOR [{col}]")
+    for ix in fetch_index_definitions(conn, schema, table):
+        if ix["primary_key"] or ix["unique_constraint"]:
+            ix = dict(ix, name=constraint_name(ix["name"]))
+        stmt = build_index_ddl(schema, target, ix, options)
+        if not ix["clustered"]:
+            ddl["secondary"].append(stmt)
+        elif options.get("clustered_before_load"):
+            ddl["pre_load"].append(stmt)
+        else:
+            ddl["clustered"].append(stmt)
+    for name, definition in fetch_check_constraints(conn, schema, table):
+        ddl["constraints"].append(f"ALTER TABLE {ref} WITH CHECK ADD CONSTRAINT [{constraint_name(name)}] CHECK {definition}")
+    for fk in fetch_foreign_keys(conn, schema, table):
+        scripted = dict(fk, name=constraint_name(fk["name"]))
+        if (fk["ref_schema"], fk["ref_table"]) == (schema, table):
+            # auto-referencia: aponta para a propria tabela carregada, nao para a atual
+            scripted["ref_table"] = target
+        ddl["foreign_keys"].append((fk, build_foreign_key_ddl(schema, target, scripted)))
+    return ddl
+
+def run_ddl_statements(conn, statements, workers=1, connect=None, database=None):
+    # Executa DDL independente; com workers > 1 cada thread usa a sua propria conexao.
+    failures = []
+    if workers <= 1 or connect is None or len(statements) <= 1:
+        for sql in statements:
+            try:
+                conn.execute(sql)
+            except Exception as e:
+                failures.append((sql, str(e)))
+        return failures
+    local = threading.local()
+    lock = threading.Lock()
+    opened = []
+
+    def execute(sql):
+        wconn = getattr(local, "conn", None)
+        if wconn is None:
+            wconn = local.conn = open_worker_conn(connect, database)
+            with lock:
+                opened.append(wconn)
+        wconn.execute(sql)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(execute, sql): sql for sql in statements}
+            for fut in as_completed(futures):
+                try:
+                    fut.result()
+                except Exception as e:
+                    failures.append((futures[fut], str(e)))
+    finally:
+        for wconn in opened:
+            try:
+                wconn.close()
+            except Exception:
+                pass
+    return failures
+
+def create_stage_table(conn, name, columns):
+    col_defs = [build_column_type(col, identity=False) for col in columns if not col[7]]
+    conn.execute(f"IF OBJECT_ID('tempdb..{name}') IS NOT NULL DROP TABLE {name}")
+    conn.execute(f"CREATE TABLE {name} (\n  " + ",\n  ".join(col_defs) + "\n)")
+
+def drop_stage_table(conn, name):
+    try:
+        conn.execute(f"IF OBJECT_ID('tempdb..{name}') IS NOT NULL DROP TABLE {name}")
+    except Exception:
+        pass
+
 def run_query(conn, sql):
     cur = conn.cursor()
     cur.execute(sql)
@@ -550,27 +1140,37 @@ def default_csv_path():
     ts = datetime.now().strftime("%Y%m%d_%H%M%S")
     return os.path.join(base, f"jupyter-ssms_results_{ts}.csv")
 
-def choose_save_path(default_path):
+CSV_FILE_FILTERS = [("CSV", "*.csv"), ("CSV gzip", "*.csv.gz"), ("CSV zstd", "*.csv.zst")]
+EXPORT_FILE_FILTERS = CSV_FILE_FILTERS + [
+    ("Parquet", "*.parquet"),
+    ("Arrow IPC", "*.arrow"),
+    ("Excel", "*.xlsx"),
+    ("JSON Lines", "*.jsonl *.jsonl.gz"),
+    ("Script INSERT", "*.sql"),
+]
+
+def choose_save_path(default_path, filters=None, title="Salvar CSV"):
     # Prefer GUI dialog if available
+    filters = filters or CSV_FILE_FILTERS
     for tool in ("zenity", "kdialog"):
-        if subprocess.run(["bash", "-lc", f"command -v {tool}"], capture_output=True).returncode == 0:
+        if find_tool(tool):
             if tool == "zenity":
                 args = [
                     "zenity",
                     "--file-selection",
                     "--save",
                     "--confirm-overwrite",
-                    "--title=Salvar CSV",
+                    f"--title={title}",
                     f"--filename={default_path}",
-                ]
+                ] + [f"--file-filter={label} | {pattern}" for label, pattern in filters]
             else:
                 args = [
                     "kdialog",
                     "--getsavefilename",
                     default_path,
-                    "CSV (*.csv)",
+                    "\n".join(f"{pattern}|{label}" for label, pattern in filters),
                     "--title",
-                    "Salvar CSV",
+                    title,
                 ]
             proc = subprocess.run(args, capture_output=True, text=True)
             if proc.returncode == 0:
@@ -579,93 +1179,937 @@ def choose_save_path(default_path):
             return None
     return None
 
+def choose_open_path(title="Abrir CSV"):
+    for tool in ("zenity", "kdialog"):
+        if find_tool(tool):
+            if tool == "zenity":
+                args = ["zenity", "--file-selection", f"--title={title}", "--file-filter=CSV | *.csv *.txt *.csv.gz *.csv.zst"]
+            else:
+                args = ["kdialog", "--getopenfilename", os.path.expanduser("~"), "*.csv *.txt *.csv.gz *.csv.zst|CSV", "--title", title]
+            proc = subprocess.run(args, capture_output=True, text=True)
+            if proc.returncode == 0:
+                path = (proc.stdout or "").strip()
+                return path if path else None
+            return None
+    return None
 
-def export_csv(path, cols, rows):
-    with open(path, "w", newline="", encoding="utf-8-sig") as f:
-        writer = csv.writer(f, delimiter=";", quoting=csv.QUOTE_MINIMAL)
-        writer.writerow(cols)
-        for r in rows:
-            writer.writerow(list(r))
 
+EXPORT_FETCH_ROWS = 5000
+EXPORT_BUFFER_BYTES = 1 << 20
 
-def screen_message(stdscr, title, message, pause=True):
-    stdscr.clear()
-    draw_header(stdscr, title)
-    h, w = stdscr.getmaxyx()
-    lines = message.splitlines()
-    for i, line in enumerate(lines[: h - 3]):
-        safe_addstr(stdscr, 2 + i, 2, line[: w - 4])
-    if pause:
-        safe_addstr(stdscr, h - 2, 2, "Pressione qualquer tecla...")
-        stdscr.getch()
+def export_codec(path):
+    # A extensao escolhida no dialogo define a compressao
+    lower = path.lower()
+    if lower.endswith(".gz"):
+        return "gzip"
+    if lower.endswith((".zst", ".zstd")):
+        return "zstd"
+    return None
 
-def screen_help(stdscr):
-    text = "\n".join(
-        [
-            f"Jupyter-SSMS {VERSION}",
-            f"OS: {get_os_pretty_name()}",
-            "",
-            "Conexao:",
-            "- Digite direto no campo selecionado (nao precisa Enter).",
-            "- Setas/TAB: navegar campos.",
-            "- ESPACO: alternar ON/OFF (Encrypt, TrustCert, Lembrar, SalvarSenha).",
-            "- F2: conectar.",
-            "- Historico no topo (TAB para alternar foco).",
-            "",
-            "Workspace (layout SSMS):",
-            "- Esquerda: arvore (Server > Databases > Tables).",
-            "- Direita (topo): editor SQL.",
-            "- Direita (baixo): resultados.",
-            "- F9: modo avancado.",
-            "- TAB: alterna foco (arvore/editor/resultados).",
-            "- Shift+TAB: foco anterior.",
-            "- Ctrl+N: nova query (aba).",
-            "- Ctrl+TAB: proxima query.",
-            "- Ctrl+Shift+TAB: query anterior.",
-            "- Ctrl+X: fechar query atual.",
-            "- F8/F7: proxima/anterior (fallback).",
-            "- Ctrl+C: copiar texto do editor.",
-            "- Ctrl+V: colar no editor.",
-            "- Home/End: inicio/fim da linha no editor.",
-            "- F5: executar query.",
-            "",
-            "Modo Avancado (Espelhar Banco):",
-            "- TAB: alterna foco Origem/Destino.",
-            "- F2: conectar origem/destino (conforme foco).",
-            "- Enter em DB (Destino): define DB destino.",
-            "- Espaco em Tabela (Origem): seleciona tabela.",
-            "- F5: iniciar espelhamento.",
-            "- F6: exportar resultados para CSV (separador ';').",
-            "- Ao salvar: abre o gerenciador de arquivos (se disponivel).",
-            "- R: atualizar listas.",
-            "- Mouse: clique para mudar foco.",
-            "",
-            "Acoes:",
-            "- Enter em DB: usa o database.",
-            "- Enter em tabela: gera SELECT TOP 100.",
-            "- S/I/U/D em tabela: gera template CRUD.",
-            "",
-            "Atalhos gerais:",
-            "- F1: ajuda.",
-            "- ESC: voltar/sair.",
-            "",
-            "Resultados:",
-            "- Setas: navega linhas/colunas (com foco em Results).",
-        ]
-    )
-    screen_message(stdscr, "Ajuda", text)
+def open_compressed(path, codec):
+    if codec == "gzip":
+        return gzip.open(path, "wb", compresslevel=6)
+    if zstandard is None:
+        raise RuntimeError("zstandard nao instalado (pip install zstandard) para gravar .zst")
+    return zstandard.ZstdCompressor(level=3).stream_writer(open(path, "wb"))
+
+@contextmanager
+def open_export_file(path, encoding="utf-8-sig"):
+    # Gera (arquivo texto, bytes gravados). Compactado: o texto vai por um pipe
+    # para uma thread que comprime, em paralelo com o fetch/formatacao das linhas.
+    codec = export_codec(path)
+    if codec is None:
+        with open(path, "w", newline="", encoding=encoding, buffering=EXPORT_BUFFER_BYTES) as f:
+            yield f, f.tell
+        return
+    dst = open_compressed(path, codec)
+    read_fd, write_fd = os.pipe()
+    state = {"bytes": 0, "error": None}
 
-def get_os_pretty_name():
-    try:
-        with open("/etc/os-release", "r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if line.startswith("PRETTY_NAME="):
-                    val = line.split("=", 1)[1].strip().strip('"')
-                    return val
-    except Exception:
-        pass
-    return "Linux"
+    def compress():
+        try:
+            with open(read_fd, "rb", buffering=0) as src, dst:
+                while True:
+                    chunk = src.read(EXPORT_BUFFER_BYTES)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+                    state["bytes"] += len(chunk)
+        except Exception as e:
+            state["error"] = e
+
+    worker = threading.Thread(target=compress, daemon=True)
+    worker.start()
+    f = open(write_fd, "w", newline="", encoding=encoding, buffering=EXPORT_BUFFER_BYTES)
+    try:
+        yield f, lambda: state["bytes"]
+    finally:
+        try:
+            f.close()
+        except OSError:
+            pass
+        worker.join()
+        if state["error"] is not None:
+            raise state["error"]
+
+def execute_for_export(conn, sql):
+    # Cursor proprio; pula os resultados sem colunas (SET NOCOUNT, INSERT...) ate o 1o SELECT
+    cur = conn.cursor()
+    cur.execute(sql)
+    while cur.description is None:
+        if not cur.nextset():
+            raise RuntimeError("A query nao retornou linhas para exportar.")
+    return cur, [d[0] for d in cur.description]
+
+def write_csv_stream(f, cur, cols, delimiter=";", report=None, cancel=None, written=None, lineterminator="\r\n"):
+    writer = csv.writer(f, delimiter=delimiter, quoting=csv.QUOTE_MINIMAL, lineterminator=lineterminator)
+    writer.writerow(cols)
+    count = 0
+    while True:
+        if cancel is not None and cancel.is_set():
+            cur.cancel()
+            break
+        rows = cur.fetchmany(EXPORT_FETCH_ROWS)
+        if not rows:
+            break
+        writer.writerows(rows)
+        count += len(rows)
+        if report:
+            report(count, written())
+    return count
+
+def export_query_csv(conn, sql, path, report=None, cancel=None):
+    # Reexecuta a query e grava direto no arquivo (memoria constante, sem o grid)
+    cur, cols = execute_for_export(conn, sql)
+    with open_export_file(path) as (f, written):
+        return write_csv_stream(f, cur, cols, ";", report, cancel, written)
+
+def export_csv(path, cols, rows, report=None, cancel=None):
+    with open_export_file(path) as (f, written):
+        writer = csv.writer(f, delimiter=";", quoting=csv.QUOTE_MINIMAL)
+        writer.writerow(cols)
+        # o csv aceita a Row do pyodbc direto (sem copia por linha)
+        for start in range(0, len(rows), EXPORT_FETCH_ROWS):
+            if cancel is not None and cancel.is_set():
+                break
+            writer.writerows(rows[start : start + EXPORT_FETCH_ROWS])
+            if report:
+                report(min(len(rows), start + EXPORT_FETCH_ROWS), written())
+
+ARROW_BATCH_ROWS = 65536
+ARROW_INT_TYPES = {"tinyint": "uint8", "smallint": "int16", "int": "int32", "bigint": "int64"}
+ARROW_INT_PRECISION = {3: "tinyint", 5: "smallint", 10: "int", 19: "bigint"}
+
+def import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except Exception:
+        raise RuntimeError("pyarrow nao instalado (pip install pyarrow) para exportar Parquet/Arrow.")
+    return pyarrow
+
+def describe_query_columns(conn, sql):
+    # (tipo SQL, precisao, escala) por coluna do 1o result set, sem executar a query
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT TYPE_NAME(system_type_id), precision, scale
+            FROM sys.dm_exec_describe_first_result_set(?, NULL, 0)
+            WHERE is_hidden = 0
+            ORDER BY column_ordinal
+            """,
+            sql,
+        )
+        return [(r[0], r[1] or 0, r[2] or 0) for r in cur.fetchall()]
+    except Exception:
+        return None
+
+def description_sql_types(description):
+    # Fallback pelo cursor.description (tipo Python + precisao/escala do driver)
+    python_types = {
+        "bool": "bit",
+        "float": "float",
+        "Decimal": "decimal",
+        "datetime": "datetime2",
+        "date": "date",
+        "time": "time",
+        "bytes": "varbinary",
+        "bytearray": "varbinary",
+    }
+    types = []
+    for d in description:
+        if d[1] is int:
+            sql_type = ARROW_INT_PRECISION.get(d[4], "bigint")
+        else:
+            sql_type = python_types.get(getattr(d[1], "__name__", ""), "nvarchar")
+        types.append((sql_type, d[4] or 0, d[5] or 0))
+    return types
+
+def arrow_column_type(pa, sql_type, precision, scale):
+    if sql_type == "bit":
+        return pa.bool_()
+    if sql_type in ARROW_INT_TYPES:
+        return getattr(pa, ARROW_INT_TYPES[sql_type])()
+    if sql_type == "real":
+        return pa.float32()
+    if sql_type == "float":
+        return pa.float64()
+    if sql_type in ("decimal", "numeric"):
+        return pa.decimal128(min(38, precision or 38), scale)
+    if sql_type == "money":
+        return pa.decimal128(19, 4)
+    if sql_type == "smallmoney":
+        return pa.decimal128(10, 4)
+    if sql_type == "date":
+        return pa.date32()
+    if sql_type == "time":
+        return pa.time64("us")
+    if sql_type in ("datetime", "datetime2", "smalldatetime"):
+        # o pyodbc entrega datetime do Python: a 7a casa do datetime2 ja vem truncada
+        return pa.timestamp("us")
+    if sql_type in ("binary", "varbinary", "image", "timestamp"):
+        return pa.binary()
+    # uniqueidentifier, datetimeoffset (texto ISO), xml, sql_variant e textos
+    return pa.string()
+
+def export_query_arrow(conn, sql, path, report=None, cancel=None, fmt="parquet"):
+    # Parquet/Arrow IPC tipados; cada fetchmany vira um record batch (row group no Parquet)
+    pa = import_pyarrow()
+    types = describe_query_columns(conn, sql)
+    cur, cols = execute_for_export(conn, sql)
+    if not types or len(types) != len(cols):
+        types = description_sql_types(cur.description)
+    schema = pa.schema([pa.field(c, arrow_column_type(pa, *t)) for c, t in zip(cols, types)])
+    # colunas de texto que o driver entrega como outro tipo (UUID, sql_variant) viram str
+    as_text = [f.type == pa.string() and d[1] is not str for f, d in zip(schema, cur.description)]
+    count = 0
+    with open(path, "wb") as raw:
+        if fmt == "parquet":
+            writer = pa.parquet.ParquetWriter(raw, schema, compression="zstd")
+        else:
+            writer = pa.ipc.new_file(raw, schema)
+        try:
+            while True:
+                if cancel is not None and cancel.is_set():
+                    cur.cancel()
+                    break
+                rows = cur.fetchmany(ARROW_BATCH_ROWS)
+                if not rows:
+                    break
+                arrays = []
+                for i, values in enumerate(zip(*rows)):
+                    if as_text[i]:
+                        values = [None if v is None else str(v) for v in values]
+                    arrays.append(pa.array(values, type=schema.field(i).type))
+                writer.write_batch(pa.record_batch(arrays, schema=schema))
+                count += len(rows)
+                if report:
+                    report(count, raw.tell())
+        finally:
+            writer.close()
+    return count
+
+XLSX_MAX_ROWS = 1048576
+XLSX_MAX_TEXT = 32767
+XLSX_NATIVE_TYPES = {"int", "float", "Decimal", "bool", "datetime", "date", "time"}
+# caracteres de controle que o XML do xlsx nao aceita (o openpyxl levanta IllegalCharacterError)
+XLSX_ILLEGAL_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+def open_xlsx_workbook(path):
+    # Workbook em streaming: xlsxwriter (constant_memory) ou openpyxl (write_only).
+    # Retorna (nova_aba(nome) -> grava_linha(valores), fechar).
+    try:
+        import xlsxwriter
+    except Exception:
+        xlsxwriter = None
+    if xlsxwriter is not None:
+        wb = xlsxwriter.Workbook(
+            path,
+            {"constant_memory": True, "use_zip64": True, "default_date_format": "yyyy-mm-dd hh:mm:ss", "strings_to_numbers": False, "strings_to_formulas": False, "strings_to_urls": False},
+        )
+
+        def add_sheet(name):
+            ws = wb.add_worksheet(name)
+            row_idx = [0]
+
+            def write_row(values):
+                ws.write_row(row_idx[0], 0, values)
+                row_idx[0] += 1
+
+            return write_row
+
+        return add_sheet, wb.close
+    try:
+        import openpyxl
+    except Exception:
+        raise RuntimeError("Instale xlsxwriter ou openpyxl (pip install xlsxwriter) para exportar XLSX.")
+    wb = openpyxl.Workbook(write_only=True)
+
+    def add_sheet(name):
+        return wb.create_sheet(name).append
+
+    return add_sheet, lambda: wb.save(path)
+
+def xlsx_converter(type_code):
+    # Conversao decidida uma vez por coluna (Excel nao tem binario/UUID; texto limitado a 32767)
+    name = getattr(type_code, "__name__", "")
+    if name in ("bytes", "bytearray"):
+        return lambda v: None if v is None else "0x" + v.hex().upper()[: XLSX_MAX_TEXT - 2]
+    if name == "str":
+        return lambda v: None if v is None else XLSX_ILLEGAL_RE.sub("", v)[:XLSX_MAX_TEXT]
+    if name in XLSX_NATIVE_TYPES:
+        return None
+    return lambda v: None if v is None else XLSX_ILLEGAL_RE.sub("", str(v))[:XLSX_MAX_TEXT]
+
+def export_query_xlsx(conn, sql, path, report=None, cancel=None):
+    # Memoria constante: linhas vao direto para a aba; ao atingir o limite do Excel abre outra aba
+    cur, cols = execute_for_export(conn, sql)
+    converters = [(i, conv) for i, conv in enumerate(xlsx_converter(d[1]) for d in cur.description) if conv]
+    add_sheet, close = open_xlsx_workbook(path)
+    count = 0
+    sheet_rows = XLSX_MAX_ROWS
+    sheet_no = 0
+    row_bytes = 0
+    try:
+        while True:
+            if cancel is not None and cancel.is_set():
+                cur.cancel()
+                break
+            rows = cur.fetchmany(EXPORT_FETCH_ROWS)
+            if not rows:
+                break
+            if not row_bytes:
+                row_bytes = max(1, estimate_rows_bytes(rows) // len(rows))
+            for row in rows:
+                if sheet_rows >= XLSX_MAX_ROWS:
+                    sheet_no += 1
+                    write_row = add_sheet(f"Resultado{sheet_no}" if sheet_no > 1 else "Resultado")
+                    write_row(cols)
+                    sheet_rows = 1
+                if converters:
+                    row = list(row)
+                    for i, conv in converters:
+                        row[i] = conv(row[i])
+                write_row(row)
+                sheet_rows += 1
+            count += len(rows)
+            if report:
+                report(count, count * row_bytes)
+        if not sheet_no:
+            add_sheet("Resultado")(cols)
+    finally:
+        close()
+    return count
+
+SQL_INSERT_MAX_ROWS = 1000  # limite do VALUES (table value constructor) no SQL Server
+
+def json_encoder(type_code):
+    # Texto JSON do valor, escolhido uma vez por coluna; decimal sai como numero exato
+    name = getattr(type_code, "__name__", "")
+    text = json.encoder.encode_basestring
+    if name == "bool":
+        return lambda v: "true" if v else "false"
+    if name == "int":
+        return int.__repr__
+    if name == "float":
+        return float.__repr__
+    if name == "Decimal":
+        return lambda v: format(v, "f")
+    if name in ("datetime", "date", "time"):
+        return lambda v: text(v.isoformat())
+    if name in ("bytes", "bytearray"):
+        return lambda v: text(base64.b64encode(v).decode("ascii"))
+    if name == "str":
+        return text
+    return lambda v: text(str(v))
+
+def sql_literal_encoder(type_code, scale=None):
+    # Literal T-SQL do valor, escolhido uma vez por coluna
+    name = getattr(type_code, "__name__", "")
+    if name == "bool":
+        return lambda v: "1" if v else "0"
+    if name == "int":
+        return int.__repr__
+    if name == "float":
+        return float.__repr__
+    if name == "Decimal":
+        return lambda v: format(v, "f")
+    if name == "datetime":
+        # datetime aceita no maximo 3 casas; ISO com T independe de DATEFORMAT
+        spec = "milliseconds" if (scale or 0) <= 3 else "microseconds"
+        return lambda v: "'" + v.isoformat(timespec=spec) + "'"
+    if name in ("date", "time"):
+        return lambda v: "'" + v.isoformat() + "'"
+    if name in ("bytes", "bytearray"):
+        return lambda v: "0x" + v.hex()
+    return lambda v: "N'" + str(v).replace("'", "''") + "'"
+
+def write_jsonl_stream(f, cur, cols, report=None, cancel=None, written=None):
+    keys = [json.encoder.encode_basestring(c) + ":" for c in cols]
+    encoders = [json_encoder(d[1]) for d in cur.description]
+    fields = list(zip(keys, encoders))
+    count = 0
+    while True:
+        if cancel is not None and cancel.is_set():
+            cur.cancel()
+            break
+        rows = cur.fetchmany(EXPORT_FETCH_ROWS)
+        if not rows:
+            break
+        f.write(
+            "".join(
+                "{" + ",".join(k + ("null" if v is None else enc(v)) for (k, enc), v in zip(fields, row)) + "}\n"
+                for row in rows
+            )
+        )
+        count += len(rows)
+        if report:
+            report(count, written())
+    return count
+
+def export_query_jsonl(conn, sql, path, report=None, cancel=None):
+    cur, cols = execute_for_export(conn, sql)
+    with open_export_file(path, encoding="utf-8") as (f, written):
+        return write_jsonl_stream(f, cur, cols, report, cancel, written)
+
+def export_query_inserts(conn, sql, path, table, batch_rows=SQL_INSERT_MAX_ROWS, report=None, cancel=None):
+    # Script de carga: INSERT com VALUES de varias linhas, um GO por lote
+    cur, cols = execute_for_export(conn, sql)
+    encoders = [sql_literal_encoder(d[1], d[5]) for d in cur.description]
+    batch_rows = max(1, min(SQL_INSERT_MAX_ROWS, int(batch_rows or SQL_INSERT_MAX_ROWS)))
+    # colunas sem nome/repetidas ganham nome unico; ] no nome vira ]]
+    names = [c[0].replace("]", "]]") for c in unique_column_names([(c,) for c in cols])]
+    header = f"INSERT INTO {build_table_ref_full(*split_table_name(table))} ({', '.join(f'[{c}]' for c in names)}) VALUES\n"
+    count = 0
+    with open_export_file(path) as (f, written):
+        f.write("SET NOCOUNT ON;\nGO\n")
+        while True:
+            if cancel is not None and cancel.is_set():
+                cur.cancel()
+                break
+            rows = cur.fetchmany(batch_rows)
+            if not rows:
+                break
+            values = ",\n".join(
+                "(" + ", ".join("NULL" if v is None else enc(v) for enc, v in zip(encoders, row)) + ")" for row in rows
+            )
+            f.write(header + values + ";\nGO\n")
+            count += len(rows)
+            if report:
+                report(count, written())
+    return count
+
+def export_format_path(path):
+    # caminho em minusculas sem o .gz/.zst final, que so indica a compressao
+    lower = path.lower()
+    if export_codec(lower):
+        lower = os.path.splitext(lower)[0]
+    return lower
+
+def export_query_file(conn, sql, path, report=None, cancel=None, insert_table="dbo.Resultado", insert_batch_rows=SQL_INSERT_MAX_ROWS):
+    # Formato pela extensao do arquivo
+    lower = export_format_path(path)
+    if lower.endswith(".parquet"):
+        return export_query_arrow(conn, sql, path, report, cancel, "parquet")
+    if lower.endswith((".arrow", ".feather")):
+        return export_query_arrow(conn, sql, path, report, cancel, "arrow")
+    if lower.endswith(".xlsx"):
+        return export_query_xlsx(conn, sql, path, report, cancel)
+    if lower.endswith((".jsonl", ".ndjson")):
+        return export_query_jsonl(conn, sql, path, report, cancel)
+    if lower.endswith(".sql"):
+        return export_query_inserts(conn, sql, path, insert_table, insert_batch_rows, report, cancel)
+    return export_query_csv(conn, sql, path, report, cancel)
+
+IMPORT_SAMPLE_ROWS = 10000
+IMPORT_BATCH_ROWS = 20000
+IMPORT_BATCH_BYTES = 16 * 1024 * 1024
+IMPORT_COMMIT_BATCHES = 20
+IMPORT_INT_RE = re.compile(r"[-+]?\d+")
+IMPORT_DECIMAL_RE = re.compile(r"[-+]?(\d*)[.,](\d+)")
+IMPORT_FLOAT_RE = re.compile(r"[-+]?(\d+([.,]\d*)?|[.,]\d+)([eE][-+]?\d+)?")
+IMPORT_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+IMPORT_DATETIME_RE = re.compile(r"\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(:\d{2}(\.(\d{1,7}))?)?")
+
+def open_import_file(path):
+    # Texto do CSV (com ou sem BOM); .gz/.zst descompactados em streaming
+    codec = export_codec(path)
+    if codec == "gzip":
+        return gzip.open(path, "rt", encoding="utf-8-sig", newline="")
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard nao instalado (pip install zstandard) para ler .zst")
+        raw = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+        return io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")
+    return open(path, "r", encoding="utf-8-sig", newline="", buffering=EXPORT_BUFFER_BYTES)
+
+def sniff_csv_delimiter(sample):
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=";,\t|").delimiter
+    except csv.Error:
+        return ";"
+
+def infer_csv_column(name, values):
+    # Tupla no formato de fetch_columns_detail, a partir de uma amostra (vazio = NULL)
+    values = [v for v in values if v != ""]
+
+    def col(data_type, max_length=0, precision=0, scale=0):
+        return (name, data_type, max_length, precision, scale, True, False, False, None, None)
+
+    # zeros a esquerda (CEP, CPF, codigos) ficam como texto
+    if values and not any(len(v) > 1 and v[0] == "0" and v[1].isdigit() for v in values):
+        if all(IMPORT_INT_RE.fullmatch(v) for v in values):
+            # folga sobre a amostra (o resto do arquivo pode ter valores maiores)
+            biggest = max(abs(int(v)) for v in values)
+            if biggest < 2**31 // 100:
+                return col("int")
+            if biggest < 2**63:
+                return col("bigint")
+        decimals = [IMPORT_DECIMAL_RE.fullmatch(v) or IMPORT_INT_RE.fullmatch(v) for v in values]
+        if all(decimals):
+            scale = max(len(m.group(2)) if m.re is IMPORT_DECIMAL_RE else 0 for m in decimals)
+            digits = max(len(v.lstrip("+-").replace(",", ".").split(".")[0]) for v in values)
+            if digits + scale <= 38:
+                return col("decimal", precision=min(38, max(18, digits + scale + 4)), scale=scale)
+        if all(IMPORT_FLOAT_RE.fullmatch(v) for v in values):
+            return col("float")
+    if values and all(IMPORT_DATE_RE.fullmatch(v) for v in values):
+        try:
+            for v in values:
+                date.fromisoformat(v)
+            return col("date")
+        except ValueError:
+            pass
+    matches = [IMPORT_DATETIME_RE.fullmatch(v) for v in values]
+    if values and all(matches):
+        try:
+            for v in values:
+                datetime.fromisoformat(v[:26])
+            return col("datetime2", scale=max(len(m.group(3) or "") for m in matches))
+        except ValueError:
+            pass
+    longest = max((len(v) for v in values), default=1)
+    # folga sobre a amostra; acima de 4000 vai para MAX
+    size = max(50, longest * 2)
+    return col("nvarchar", -1 if size > 4000 else size * 2)
+
+def csv_value_parser(data_type):
+    # Conversao texto -> valor, escolhida uma vez por coluna pelo tipo do destino
+    dt = (data_type or "").lower()
+    if dt in ("tinyint", "smallint", "int", "bigint"):
+        return int
+    if dt == "bit":
+        return lambda v: v.lower() in ("1", "true", "t", "s", "sim", "y", "yes")
+    if dt in ("decimal", "numeric", "money", "smallmoney"):
+        return lambda v: decimal.Decimal(v.replace(",", ".") if "." not in v else v)
+    if dt in ("float", "real"):
+        return lambda v: float(v.replace(",", ".") if "." not in v else v)
+    if dt == "date":
+        return date.fromisoformat
+    if dt in ("datetime", "datetime2", "smalldatetime"):
+        return lambda v: datetime.fromisoformat(v[:26])
+    if dt == "time":
+        return lambda v: time_of_day.fromisoformat(v[:15])
+    if dt == "uniqueidentifier":
+        return uuid.UUID
+    if dt in ("binary", "varbinary", "image"):
+        return lambda v: bytes.fromhex(v[2:] if v[:2] in ("0x", "0X") else v)
+    return None
+
+def csv_row_source(reader, positions, parsers, first_line=2):
+    # Objeto com fetchmany() para o copy_rows: o parse roda na thread leitora,
+    # em paralelo com o executemany (que libera o GIL) do lote anterior.
+    state = {"line": first_line - 1}
+    converters = [(i, pos, parser) for i, (pos, parser) in enumerate(zip(positions, parsers))]
+
+    def fetchmany(size):
+        rows = []
+        for raw in itertools.islice(reader, size):
+            state["line"] += 1
+            row = [None] * len(converters)
+            try:
+                for i, pos, parser in converters:
+                    v = raw[pos] if pos < len(raw) else ""
+                    if v != "":
+                        row[i] = parser(v) if parser else v
+            except (ValueError, ArithmeticError) as e:
+                raise RuntimeError(f"Linha {state['line']}, coluna {i + 1}: valor invalido {v!r} ({e})")
+            rows.append(row)
+        return rows
+
+    return types.SimpleNamespace(fetchmany=fetchmany, state=state)
+
+def read_csv_sample(path):
+    with open_import_file(path) as f:
+        delimiter = sniff_csv_delimiter(f.read(64 * 1024))
+    with open_import_file(path) as f:
+        reader = csv.reader(f, delimiter=delimiter)
+        header = next(reader, None)
+        if not header:
+            raise RuntimeError("CSV vazio.")
+        sample = list(itertools.islice(reader, IMPORT_SAMPLE_ROWS))
+    return delimiter, header, sample
+
+def plan_csv_import(conn, path, schema, table):
+    # Colunas do destino: a tabela existente (casando pelo nome do cabecalho) ou
+    # uma nova com tipos inferidos da amostra.
+    delimiter, header, sample = read_csv_sample(path)
+    cur = conn.cursor()
+    cur.execute("SELECT OBJECT_ID(?, 'U')", (f"{schema}.{table}",))
+    exists = cur.fetchone()[0] is not None
+    if exists:
+        by_name = {c[0].lower(): c for c in fetch_columns_detail(conn, schema, table) if not c[7]}
+        missing = [h for h in header if h.lower() not in by_name]
+        if missing:
+            raise RuntimeError("Colunas do CSV sem correspondente na tabela: " + ", ".join(missing[:10]))
+        columns = [by_name[h.lower()] for h in header]
+    else:
+        columns = unique_column_names(
+            [
+                infer_csv_column(h or f"col{i + 1}", [r[i] if i < len(r) else "" for r in sample])
+                for i, h in enumerate(header)
+            ]
+        )
+    return {
+        "path": path,
+        "schema": schema,
+        "table": table,
+        "exists": exists,
+        "delimiter": delimiter,
+        "columns": columns,
+        "sample_rows": len(sample),
+    }
+
+def bulk_insert_rows(conn, schema, table, columns, source, report=None):
+    # Carga de source.fetchmany() na tabela: TABLOCK + transacoes de varios lotes
+    # (minimal logging numa tabela vazia/heap), fast_executemany com setinputsizes.
+    table_ref = build_table_ref_full(schema, table)
+    insert_sql = build_insert_sql(schema, table, [c[0] for c in columns], table_hint="TABLOCK")
+    write = make_row_writer(conn, insert_sql, columns)
+    has_identity = any(c[6] for c in columns)
+    metrics = new_copy_metrics()
+    if has_identity:
+        conn.execute(f"SET IDENTITY_INSERT {table_ref} ON")
+    conn.autocommit = False
+    try:
+        count = copy_rows(
+            source,
+            write,
+            IMPORT_BATCH_ROWS,
+            report,
+            commit_every=IMPORT_COMMIT_BATCHES,
+            commit=conn.commit,
+            metrics=metrics,
+            batch_bytes=IMPORT_BATCH_BYTES,
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.autocommit = True
+        if has_identity:
+            conn.execute(f"SET IDENTITY_INSERT {table_ref} OFF")
+    return count, metrics
+
+def import_csv(conn, plan, report=None):
+    schema, table, columns = plan["schema"], plan["table"], plan["columns"]
+    if not plan["exists"]:
+        create_table_from_columns(conn, schema, table, columns)
+    try:
+        with open_import_file(plan["path"]) as f:
+            reader = csv.reader(f, delimiter=plan["delimiter"])
+            next(reader, None)
+            source = csv_row_source(reader, range(len(columns)), [csv_value_parser(c[1]) for c in columns])
+            count, metrics = bulk_insert_rows(conn, schema, table, columns, source, report)
+    except Exception:
+        # tabela criada aqui: nao deixa a carga pela metade (os lotes ja tinham commit)
+        if not plan["exists"]:
+            drop_table_if_exists(conn, schema, table)
+        raise
+    log_event(f"Import CSV: {plan['path']} -> {build_table_ref_full(schema, table)} ({count} linhas)")
+    return count, metrics
+
+def describe_query_table_columns(conn, sql):
+    # Colunas do 1o result set no formato de fetch_columns_detail (sem executar a query)
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT name, TYPE_NAME(system_type_id), max_length, precision, scale, is_nullable
+            FROM sys.dm_exec_describe_first_result_set(?, NULL, 0)
+            WHERE is_hidden = 0
+            ORDER BY column_ordinal
+            """,
+            sql,
+        )
+        return [(r[0], r[1], r[2], r[3], r[4], r[5], False, False, None, None) for r in cur.fetchall()]
+    except Exception:
+        return None
+
+def description_table_columns(description):
+    # Fallback pelo cursor.description: tipo Python + tamanho/precisao/escala do driver
+    columns = []
+    for d, (sql_type, precision, scale) in zip(description, description_sql_types(description)):
+        size = d[3] or 0
+        max_length = 0
+        if sql_type == "nvarchar":
+            max_length = -1 if not size or size > 4000 else size * 2
+        elif sql_type == "varbinary":
+            max_length = -1 if not size or size > 8000 else size
+        columns.append((d[0], sql_type, max_length, precision, scale, True, False, False, None, None))
+    return columns
+
+def unique_column_names(columns):
+    # Resultados aceitam colunas sem nome ou repetidas; a tabela nao
+    seen = set()
+    result = []
+    for i, col in enumerate(columns):
+        name = col[0] or f"col{i + 1}"
+        base, n = name, 1
+        while name.lower() in seen:
+            n += 1
+            name = f"{base}_{n}"
+        seen.add(name.lower())
+        result.append((name,) + tuple(col[1:]))
+    return result
+
+def save_query_to_table(source_conn, dest_conn, sql, schema, table, report=None, cancel=None):
+    # Resultado da query direto na tabela de outra conexao, em streaming (sem disco/grid).
+    # Tabela nova: tipos do result set; existente: colunas casadas pelo nome.
+    columns = describe_query_table_columns(source_conn, sql)
+    cur, cols = execute_for_export(source_conn, sql)
+    if not columns or len(columns) != len(cols):
+        columns = description_table_columns(cur.description)
+    columns = unique_column_names(columns)
+    check = dest_conn.cursor()
+    check.execute("SELECT OBJECT_ID(?, 'U')", (f"{schema}.{table}",))
+    created = check.fetchone()[0] is None
+    if created:
+        create_table_from_columns(dest_conn, schema, table, columns)
+    else:
+        by_name = {c[0].lower(): c for c in fetch_columns_detail(dest_conn, schema, table) if not c[7]}
+        missing = [c[0] for c in columns if c[0].lower() not in by_name]
+        if missing:
+            raise RuntimeError("Colunas do resultado sem correspondente na tabela: " + ", ".join(missing[:10]))
+        columns = [by_name[c[0].lower()] for c in columns]
+
+    def fetchmany(size):
+        if cancel is not None and cancel.is_set():
+            cur.cancel()
+            raise RuntimeError("Cancelado.")
+        return cur.fetchmany(size)
+
+    try:
+        count, _ = bulk_insert_rows(dest_conn, schema, table, columns, types.SimpleNamespace(fetchmany=fetchmany), report)
+    except Exception:
+        if created:
+            drop_table_if_exists(dest_conn, schema, table)
+        raise
+    log_event(f"Resultado salvo em tabela: {build_table_ref_full(schema, table)} ({count} linhas)")
+    return count
+
+def estimate_query_rows(conn, sql):
+    # Estimativa do otimizador (SHOWPLAN_ALL nao executa a query); None se nao der
+    cur = conn.cursor()
+    try:
+        cur.execute("SET SHOWPLAN_ALL ON")
+        try:
+            cur.execute(sql)
+            while True:
+                cols = [d[0] for d in cur.description or []]
+                if "EstimateRows" in cols and "Type" in cols:
+                    for row in cur.fetchall():
+                        if row[cols.index("Type")] == "SELECT":
+                            return int(float(row[cols.index("EstimateRows")] or 0))
+                if not cur.nextset():
+                    return None
+        finally:
+            cur.execute("SET SHOWPLAN_ALL OFF")
+    except Exception:
+        return None
+
+def start_export_job(jobs, path, run, estimate=None, label=None):
+    # Cada exportacao roda na sua thread; run(job, report) grava o arquivo e
+    # deve respeitar job["cancel"]. Cancelada ou com erro, o parcial e apagado.
+    # path=None: destino nao e arquivo (ex.: tabela); run cuida da limpeza.
+    job = {
+        "path": path,
+        "label": label or os.path.basename(path),
+        "rows": 0,
+        "bytes": 0,
+        "estimate": estimate,
+        "started": time.time(),
+        "finished": None,
+        "status": "rodando",
+        "error": "",
+        "cancel": threading.Event(),
+    }
+
+    def report(count, size):
+        job["rows"] = count
+        job["bytes"] = size
+
+    def worker():
+        try:
+            run(job, report)
+            status = "cancelado" if job["cancel"].is_set() else "ok"
+        except Exception as e:
+            status = "cancelado" if job["cancel"].is_set() else "erro"
+            job["error"] = str(e)
+        if status != "ok" and path:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        # a tela le o status sem trava: finished precisa estar pronto antes
+        job["finished"] = time.time()
+        job["status"] = status
+        log_event(f"Exportacao {job['status']}: {path or job['label']} ({job['rows']} linhas) {job['error']}".rstrip())
+
+    job["thread"] = threading.Thread(target=worker, daemon=True)
+    jobs.append(job)
+    job["thread"].start()
+    return job
+
+def format_export_status(job):
+    name = job["label"]
+    elapsed = max(0.001, (job["finished"] or time.time()) - job["started"])
+    if job["status"] != "rodando":
+        detail = job["error"] if job["status"] == "erro" else f"{job['rows']} linhas em {format_duration(elapsed)}"
+        return f"{name}: {job['status']} - {detail}"
+    rate = job["rows"] / elapsed
+    text = f"{name}: {job['rows']} linhas"
+    if job["bytes"] is not None:
+        text += f" | {job['bytes'] / elapsed / (1024 * 1024):.1f} MB/s"
+    else:
+        text += f" | {rate:.0f} linhas/s"
+    estimate = job["estimate"]
+    if estimate and rate > 0:
+        if job["rows"] < estimate:
+            text += f" | {job['rows'] * 100 // estimate}% ETA {format_duration((estimate - job['rows']) / rate)}"
+        else:
+            text += " | acima da estimativa"
+    return text
+
+def screen_exports(stdscr, jobs):
+    idx = 0
+    stdscr.timeout(500)
+    try:
+        while True:
+            stdscr.clear()
+            draw_header(stdscr, "Exportacoes")
+            h, w = stdscr.getmaxyx()
+            if not jobs:
+                safe_addstr(stdscr, 2, 2, "Nenhuma exportacao nesta sessao.")
+            idx = max(0, min(idx, len(jobs) - 1))
+            for i, job in enumerate(jobs[: max(1, h - 5)]):
+                attr = curses.A_REVERSE if i == idx else 0
+                safe_addstr(stdscr, 2 + i, 2, format_export_status(job)[: w - 4], attr)
+            safe_addstr(stdscr, h - 2, 2, "Setas = selecionar | C/Del = cancelar | L = limpar concluidas | ESC = voltar"[: w - 4])
+            stdscr.refresh()
+            ch = stdscr.getch()
+            if ch in (27, curses.KEY_ENTER, 10, 13):
+                return
+            if ch == curses.KEY_UP:
+                idx -= 1
+            elif ch == curses.KEY_DOWN:
+                idx += 1
+            elif ch in (ord("c"), ord("C"), curses.KEY_DC) and jobs:
+                jobs[idx]["cancel"].set()
+            elif ch in (ord("l"), ord("L")):
+                jobs[:] = [j for j in jobs if j["status"] == "rodando"]
+    finally:
+        stdscr.timeout(-1)
+
+
+def screen_message(stdscr, title, message, pause=True):
+    stdscr.clear()
+    draw_header(stdscr, title)
+    h, w = stdscr.getmaxyx()
+    lines = message.splitlines()
+    for i, line in enumerate(lines[: h - 3]):
+        safe_addstr(stdscr, 2 + i, 2, line[: w - 4])
+    if pause:
+        safe_addstr(stdscr, h - 2, 2, "Pressione qualquer tecla...")
+        stdscr.getch()
+
+def screen_help(stdscr):
+    text = "\n".join(
+        [
+            f"Jupyter-SSMS {VERSION}",
+            f"OS: {get_os_pretty_name()}",
+            "",
+            "Conexao:",
+            "- Digite direto no campo selecionado (nao precisa Enter).",
+            "- Setas/TAB: navegar campos.",
+            "- ESPACO: alternar ON/OFF (Encrypt, TrustCert, Lembrar, SalvarSenha).",
+            "- F2: conectar.",
+            "- Historico no topo (TAB para alternar foco).",
+            "",
+            "Workspace (layout SSMS):",
+            "- Esquerda: arvore (Server > Databases > Tables).",
+            "- Direita (topo): editor SQL.",
+            "- Direita (baixo): resultados.",
+            "- F9: modo avancado.",
+            "- TAB: alterna foco (arvore/editor/resultados).",
+            "- Shift+TAB: foco anterior.",
+            "- Ctrl+N: nova query (aba).",
+            "- Ctrl+TAB: proxima query.",
+            "- Ctrl+Shift+TAB: query anterior.",
+            "- Ctrl+X: fechar query atual.",
+            "- F8/F7: proxima/anterior (fallback).",
+            "- Ctrl+C: copiar texto do editor.",
+            "- Ctrl+V: colar no editor.",
+            "- Home/End: inicio/fim da linha no editor.",
+            "- F5: executar query.",
+            "- F6: exportar resultados para CSV (separador ';').",
+            "- Ctrl+E: exportar a query da aba (CSV, .gz/.zst, Parquet, Arrow, XLSX, JSONL, INSERT .sql) sem carregar o grid.",
+            "- Ctrl+T: exportacoes em segundo plano (progresso, cancelar).",
+            "- Ctrl+O: importar CSV para tabela nova (tipos inferidos) ou existente.",
+            "- Ctrl+S: salvar o resultado da query numa tabela de outra conexao (streaming).",
+            "",
+            "Modo Avancado (Espelhar Banco):",
+            "- TAB: alterna foco Origem/Destino.",
+            "- F2: conectar origem/destino (conforme foco).",
+            "- Enter em DB (Destino): define DB destino.",
+            "- Espaco em Tabela (Origem): seleciona tabela.",
+            "- F3: opcoes do espelhamento (ex: incremental).",
+            "- F4: filtro da tabela selecionada (WHERE/TOP/TABLESAMPLE).",
+            "- F5: planejamento (tamanho/duracao estimados) e inicio do espelhamento.",
+            "- F6: comparar origem x destino e ressincronizar diferencas.",
+            "- Ao salvar: abre o gerenciador de arquivos (se disponivel).",
+            "- R: atualizar listas.",
+            "- Mouse: clique para mudar foco.",
+            "",
+            "Acoes:",
+            "- Enter em DB: usa o database.",
+            "- Enter em tabela: gera SELECT TOP 100.",
+            "- S/I/U/D em tabela: gera template CRUD.",
+            "",
+            "Atalhos gerais:",
+            "- F1: ajuda.",
+            "- ESC: voltar/sair.",
+            "",
+            "Resultados:",
+            "- Setas: navega linhas/colunas (com foco em Results).",
+        ]
+    )
+    screen_message(stdscr, "Ajuda", text)
+
+def get_os_pretty_name():
+    try:
+        with open("/etc/os-release", "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith("PRETTY_NAME="):
+                    val = line.split("=", 1)[1].strip().strip('"')
+                    return val
+    except Exception:
+        pass
+    return "Linux"
 
 
 def screen_splash(stdscr):
@@ -1122,13 +2566,36 @@ def split_table_name(name):
         return name.split(".", 1)
     return "dbo", name
 
-def build_insert_sql(schema, table, columns, param_wrappers=None):
+def build_insert_sql(schema, table, columns, param_wrappers=None, table_hint=None):
+    return build_insert_into(build_table_ref_full(schema, table), columns, param_wrappers, table_hint)
+
+def build_insert_into(target_ref, columns, param_wrappers=None, table_hint=None):
     cols = ", ".join(f"[{c}]" for c in columns)
     if param_wrappers:
         params = ", ".join(param_wrappers)
     else:
         params = ", ".join(["?"] * len(columns))
-    return f"INSERT INTO {build_table_ref_full(schema, table)} ({cols}) VALUES ({params})"
+    hint = f" WITH ({table_hint})" if table_hint else ""
+    return f"INSERT INTO {target_ref}{hint} ({cols}) VALUES ({params})"
+
+def build_merge_sql(target_ref, stage_ref, columns, key_cols, identity_cols=()):
+    on = " AND ".join(f"t.[{k}] = s.[{k}]" for k in key_cols)
+    update_cols = [c for c in columns if c not in key_cols and c not in identity_cols]
+    cols = ", ".join(f"[{c}]" for c in columns)
+    vals = ", ".join(f"s.[{c}]" for c in columns)
+    sql = f"MERGE {target_ref} AS t USING {stage_ref} AS s ON {on}"
+    if update_cols:
+        sets = ", ".join(f"t.[{c}] = s.[{c}]" for c in update_cols)
+        sql += f" WHEN MATCHED THEN UPDATE SET {sets}"
+    sql += f" WHEN NOT MATCHED BY TARGET THEN INSERT ({cols}) VALUES ({vals});"
+    return sql
+
+def build_delete_by_keys_sql(target_ref, keys_ref, key_cols, missing=False):
+    on = " AND ".join(f"t.[{k}] = k.[{k}]" for k in key_cols)
+    if missing:
+        # apaga o que NAO esta na lista de chaves da origem
+        return f"DELETE t FROM {target_ref} AS t WHERE NOT EXISTS (SELECT 1 FROM {keys_ref} AS k WHERE {on})"
+    return f"DELETE t FROM {target_ref} AS t JOIN {keys_ref} AS k ON {on}"
 
 def edit_text_multiline(stdscr, win, initial_text, action_keys=None, help_callback=None):
     maxy, maxx = win.getmaxyx()
@@ -1290,6 +2757,7 @@ def editor_edit(stdscr, y, x, h, w, initial_sql):
         353: "tab_prev",
         curses.ascii.SO: "new_tab",   # Ctrl+N
         curses.ascii.CAN: "close_tab",# Ctrl+X
+        curses.ascii.ENQ: "export_query",  # Ctrl+E
         curses.KEY_CTAB: "switch_tab_next",
         341: "switch_tab_next",
         curses.KEY_CATAB: "switch_tab_prev",
@@ -1317,7 +2785,7 @@ def editor_edit(stdscr, y, x, h, w, initial_sql):
     return sql, action or "edited"
 
 
-def screen_workspace(stdscr, conn, cfg, current):
+def screen_workspace(stdscr, conn, cfg, current, password=None):
     focus = "tree"
     tree_idx = 0
     dbs = []
@@ -1329,6 +2797,7 @@ def screen_workspace(stdscr, conn, cfg, current):
     tab_index = 0
     tab_seq = 1
     enter_edit_on_focus = False
+    export_jobs = []
     def new_tab(initial_text=""):
         nonlocal tab_seq, tab_index
         title = f"SQLQuery_{tab_seq}"
@@ -1355,6 +2824,155 @@ def screen_workspace(stdscr, conn, cfg, current):
     def current_tab():
         return tabs[tab_index]
 
+    def query_conn_cfg():
+        # conexao propria por exportacao, no banco em uso agora na aba
+        export_cfg = dict(cfg)
+        export_cfg.update(current)
+        try:
+            export_cfg["database"] = conn.cursor().execute("SELECT DB_NAME()").fetchone()[0]
+        except Exception:
+            pass
+        return export_cfg
+
+    def save_to_table(sql, y, x, h, w):
+        if not sql.strip():
+            panel_message(stdscr, y, x, h, w, "Salvar em tabela", "Editor vazio.")
+            return
+        export_cfg = query_conn_cfg()
+        tmp_current = {
+            "name": "",
+            "host": "",
+            "port": cfg.get("port", "1433") or "1433",
+            "user": "",
+            "database": "master",
+            "driver": cfg.get("driver", "ODBC Driver 18 for SQL Server"),
+        }
+        cfg2, cur2, pwd2 = screen_connect(stdscr, cfg, tmp_current, "")
+        if cfg2 is None:
+            return
+        target_cfg = dict(cfg2)
+        target_cfg.update(cur2)
+        target = prompt_input(stdscr, "Tabela de destino (nova ou existente):", "dbo.Resultado")
+        if not target:
+            return
+        schema, table = split_table_name(target)
+
+        def run(job, report):
+            source_conn, err = connect_db(export_cfg, password)
+            if source_conn is None:
+                raise RuntimeError(err)
+            try:
+                dest_conn, err = connect_db(target_cfg, pwd2)
+                if dest_conn is None:
+                    raise RuntimeError(err)
+                try:
+                    job["estimate"] = estimate_query_rows(source_conn, sql)
+                    save_query_to_table(source_conn, dest_conn, sql, schema, table, lambda count: report(count, None), job["cancel"])
+                finally:
+                    dest_conn.close()
+            finally:
+                source_conn.close()
+
+        label = f"{build_table_ref_full(schema, table)} em {cur2.get('host') or '-'}/{cur2.get('database') or 'master'}"
+        start_export_job(export_jobs, None, run, label=label)
+
+    def export_query(sql, y, x, h, w):
+        if not sql.strip():
+            panel_message(stdscr, y, x, h, w, "Exportar query", "Editor vazio.")
+            return
+        export_cfg = query_conn_cfg()
+        default_path = default_csv_path()
+        try:
+            curses.endwin()
+        except Exception:
+            pass
+        path = choose_save_path(default_path, EXPORT_FILE_FILTERS, "Exportar query") or prompt_input(
+            stdscr, "Exportar query em (.csv, .csv.gz, .csv.zst, .parquet, .arrow, .xlsx, .jsonl, .sql):", default_path
+        )
+        if not path:
+            return
+        insert_table = "dbo.Resultado"
+        if export_format_path(path).endswith(".sql"):
+            insert_table = prompt_input(stdscr, "Tabela de destino dos INSERT:", insert_table)
+            if not insert_table:
+                return
+        insert_batch_rows = cfg.get("export", {}).get("insert_batch_rows") or SQL_INSERT_MAX_ROWS
+
+        def run(job, report):
+            export_conn, err = connect_db(export_cfg, password)
+            if export_conn is None:
+                raise RuntimeError(err)
+            try:
+                job["estimate"] = estimate_query_rows(export_conn, sql)
+                export_query_file(export_conn, sql, path, report, job["cancel"], insert_table, insert_batch_rows)
+            finally:
+                export_conn.close()
+
+        start_export_job(export_jobs, path, run)
+
+    def import_csv_file(y, x, h, w):
+        try:
+            curses.endwin()
+        except Exception:
+            pass
+        path = choose_open_path() or prompt_input(stdscr, "Arquivo CSV para importar:", "")
+        if not path:
+            return
+        if not os.path.isfile(path):
+            panel_message(stdscr, y, x, h, w, "Importar CSV", f"Arquivo nao encontrado:\n{path}")
+            return
+        stem = os.path.basename(path).split(".")[0]
+        target = prompt_input(stdscr, "Tabela de destino (nova ou existente):", "dbo." + re.sub(r"\W", "_", stem))
+        if not target:
+            return
+        schema, table = split_table_name(target)
+        try:
+            plan = plan_csv_import(conn, path, schema, table)
+        except Exception as e:
+            panel_message(stdscr, y, x, h, w, "Erro", str(e))
+            return
+        lines = [
+            f"Arquivo: {path}",
+            f"Destino: {build_table_ref_full(schema, table)} ({'existente' if plan['exists'] else 'nova'})",
+            f"Separador: {plan['delimiter']!r} | Amostra: {plan['sample_rows']} linhas",
+            "",
+        ]
+        lines += [build_column_type(c, identity=False) for c in plan["columns"]]
+        if not screen_confirm(stdscr, "Importar CSV", "\n".join(lines)):
+            return
+        started = time.time()
+        last = [0.0]
+
+        def report(count):
+            now = time.time()
+            if now - last[0] < 0.5:
+                return
+            last[0] = now
+            stdscr.nodelay(True)
+            ch = stdscr.getch()
+            stdscr.nodelay(False)
+            if ch == 27:
+                if plan["exists"]:
+                    raise RuntimeError(f"Importacao cancelada pelo usuario (lotes ja confirmados: ate {count} linhas).")
+                raise RuntimeError("Importacao cancelada pelo usuario (tabela nova removida).")
+            elapsed = max(0.001, now - started)
+            win = panel_window(stdscr, y, x, h, w, "Importando CSV")
+            safe_addstr(win, 1, 2, f"{count} linhas | {count / elapsed:.0f} linhas/s | {format_duration(elapsed)}"[: w - 4])
+            safe_addstr(win, 2, 2, "ESC = cancelar"[: w - 4])
+            win.refresh()
+
+        try:
+            count, metrics = import_csv(conn, plan, report)
+            elapsed = max(0.001, time.time() - started)
+            tables_cache.clear()
+            panel_message(
+                stdscr, y, x, h, w, "Importar CSV",
+                f"{count} linhas em {format_duration(elapsed)} ({count / elapsed:.0f} linhas/s)\n"
+                f"Leitura/parse: {metrics['fetch_seconds']:.1f}s | Insercao: {metrics['insert_seconds']:.1f}s",
+            )
+        except Exception as e:
+            panel_message(stdscr, y, x, h, w, "Erro", str(e))
+
     def execute_and_set(sql):
         nonlocal focus
         res = current_tab()["result"]
@@ -1439,6 +3057,9 @@ def screen_workspace(stdscr, conn, cfg, current):
                 enter_edit_on_focus = False
                 if action == "execute":
                     execute_and_set(tab["text"])
+                elif action == "export_query":
+                    result_y = content_top + editor_h + 1
+                    export_query(tab["text"], result_y, right_x, result_h, right_w)
                 elif action == "tab_next":
                     focus = "results"
                 elif action == "tab_prev":
@@ -1523,8 +3144,16 @@ def screen_workspace(stdscr, conn, cfg, current):
                 info = f"Setas=Scroll | <-/->=Colunas | F6=Salvar CSV | Rows={res['row_count']} Cols={res['col_count']}"
                 safe_addstr(results_win, result_h - 2, 2, info[: right_w - 4])
 
+            # Exportacoes em segundo plano (linha acima do rodape)
+            running = [j for j in export_jobs if j["status"] == "rodando"]
+            recent = [j for j in export_jobs if j["status"] != "rodando" and time.time() - j["finished"] < 10]
+            if running or recent:
+                status = " | ".join(format_export_status(j) for j in running + recent)
+                safe_addstr(stdscr, h - 2, 2, f"Exportacoes: {status}"[: w - 4])
+            stdscr.timeout(500 if running or recent else -1)
+
             # Footer
-            footer = "ESC = Desconectar | R = Atualizar | F9 = Modo avancado | TAB = Alternar foco | Shift+TAB = Foco anterior | Ctrl+N = Nova query | Ctrl+X = Fechar query | Ctrl+TAB = Trocar query | F6 = Salvar CSV | F1 = Ajuda"
+            footer = "ESC = Desconectar | R = Atualizar | F9 = Modo avancado | TAB = Alternar foco | Shift+TAB = Foco anterior | Ctrl+N = Nova query | Ctrl+X = Fechar query | Ctrl+TAB = Trocar query | F6 = Salvar CSV | Ctrl+E = Exportar query | Ctrl+T = Exportacoes | Ctrl+O = Importar CSV | Ctrl+S = Salvar em tabela | F1 = Ajuda"
             safe_addstr(stdscr, h - 1, 2, footer[: w - 4])
 
             stdscr.refresh()
@@ -1533,13 +3162,28 @@ def screen_workspace(stdscr, conn, cfg, current):
             results_win.refresh()
 
             ch = stdscr.getch()
+            stdscr.timeout(-1)
+            if ch == -1:
+                continue
             if ch == curses.KEY_F1:
                 screen_help(stdscr)
                 continue
             if ch in (27,):
+                if running:
+                    panel_message(stdscr, result_y, editor_x, result_h, right_w, "Exportacoes", "Ha exportacoes em andamento.\nCancele ou aguarde (Ctrl+T) antes de desconectar.")
+                    continue
                 return "disconnect"
             if ch == curses.KEY_F9:
-                screen_advanced(stdscr, cfg, current, conn)
+                screen_advanced(stdscr, cfg, current, conn, password)
+                continue
+            if ch == curses.ascii.DC4:  # Ctrl+T
+                screen_exports(stdscr, export_jobs)
+                continue
+            if ch == curses.ascii.SI:  # Ctrl+O
+                import_csv_file(result_y, editor_x, result_h, right_w)
+                continue
+            if ch == curses.ascii.DC3:  # Ctrl+S
+                save_to_table(tab["text"], result_y, editor_x, result_h, right_w)
                 continue
             if ch == curses.KEY_F6:
                 if res["cols"] is not None and res["rows"] is not None:
@@ -1550,14 +3194,19 @@ def screen_workspace(stdscr, conn, cfg, current):
                         pass
                     path = choose_save_path(default_path) or prompt_input(stdscr, "Salvar CSV em:", default_path)
                     if path:
-                        try:
-                            export_csv(path, res["cols"], res["rows"])
-                            panel_message(stdscr, result_y, editor_x, result_h, right_w, "Download CSV", f"Salvo em:\n{path}")
-                        except Exception as e:
-                            panel_message(stdscr, result_y, editor_x, result_h, right_w, "Erro", str(e))
+                        cols, rows = res["cols"], res["rows"]
+                        start_export_job(
+                            export_jobs,
+                            path,
+                            lambda job, report, path=path, cols=cols, rows=rows: export_csv(path, cols, rows, report, job["cancel"]),
+                            estimate=len(rows),
+                        )
                 else:
                     panel_message(stdscr, result_y, editor_x, result_h, right_w, "Download CSV", "Nenhum resultado para exportar.")
                 continue
+            if ch == curses.ascii.ENQ:  # Ctrl+E
+                export_query(tab["text"], result_y, editor_x, result_h, right_w)
+                continue
             if ch == curses.ascii.SO:  # Ctrl+N
                 new_tab("")
                 focus = "editor"
@@ -1758,6 +3407,8 @@ def screen_workspace(stdscr, conn, cfg, current):
                     tab["text"] = new_text
                     if action == "execute":
                         execute_and_set(tab["text"])
+                    elif action == "export_query":
+                        export_query(tab["text"], result_y, editor_x, result_h, right_w)
                     elif action == "tab_next":
                         focus = "results"
                     elif action == "tab_prev":
@@ -1868,246 +3519,1958 @@ def screen_pick(stdscr, title, items, footer="Enter = Selecionar | ESC = Voltar"
     idx = 0
     while True:
         stdscr.clear()
-        draw_header(stdscr, title)
+        draw_header(stdscr, title)
+        h, w = stdscr.getmaxyx()
+        max_lines = h - 4
+        start = 0
+        if idx >= max_lines:
+            start = idx - max_lines + 1
+        for i, item in enumerate(items[start : start + max_lines]):
+            y = 2 + i
+            attr = curses.A_REVERSE if (start + i) == idx else 0
+            safe_addstr(stdscr, y, 2, str(item)[: w - 4], attr)
+        safe_addstr(stdscr, h - 2, 2, footer[: w - 4])
+        stdscr.refresh()
+        ch = stdscr.getch()
+        if ch in (27,):
+            return None
+        if ch in (curses.KEY_UP,):
+            idx = (idx - 1) % len(items)
+        elif ch in (curses.KEY_DOWN,):
+            idx = (idx + 1) % len(items)
+        elif ch in (curses.KEY_ENTER, 10, 13):
+            return items[idx]
+
+def screen_select_multi(stdscr, title, items):
+    if not items:
+        screen_message(stdscr, title, "Nenhum item encontrado.")
+        return None
+    selected = [False] * len(items)
+    idx = 0
+    while True:
+        stdscr.clear()
+        draw_header(stdscr, title)
+        h, w = stdscr.getmaxyx()
+        max_lines = h - 4
+        start = 0
+        if idx >= max_lines:
+            start = idx - max_lines + 1
+        for i, item in enumerate(items[start : start + max_lines]):
+            idx_abs = start + i
+            mark = "[x]" if selected[idx_abs] else "[ ]"
+            line = f"{mark} {item}"
+            attr = curses.A_REVERSE if idx_abs == idx else 0
+            safe_addstr(stdscr, 2 + i, 2, line[: w - 4], attr)
+        safe_addstr(stdscr, h - 2, 2, "Espaco = marcar | Enter = confirmar | ESC = voltar")
+        stdscr.refresh()
+        ch = stdscr.getch()
+        if ch in (27,):
+            return None
+        if ch in (curses.KEY_UP,):
+            idx = (idx - 1) % len(items)
+        elif ch in (curses.KEY_DOWN,):
+            idx = (idx + 1) % len(items)
+        elif ch in (ord(" "),):
+            selected[idx] = not selected[idx]
+        elif ch in (curses.KEY_ENTER, 10, 13):
+            chosen = [items[i] for i, flag in enumerate(selected) if flag]
+            if chosen:
+                return chosen
+
+def screen_confirm(stdscr, title, message):
+    stdscr.clear()
+    draw_header(stdscr, title)
+    h, w = stdscr.getmaxyx()
+    lines = message.splitlines()
+    for i, line in enumerate(lines[: h - 4]):
+        safe_addstr(stdscr, 2 + i, 2, line[: w - 4])
+    safe_addstr(stdscr, h - 2, 2, "Enter = Iniciar | ESC = Cancelar")
+    stdscr.refresh()
+    while True:
+        ch = stdscr.getch()
+        if ch in (27,):
+            return False
+        if ch in (curses.KEY_ENTER, 10, 13):
+            return True
+
+def draw_advanced_layout(stdscr, state, progress=None):
+    stdscr.clear()
+    draw_header(stdscr, f"Jupyter-SSMS {VERSION} - Modo Avançado")
+    h, w = stdscr.getmaxyx()
+    if h < 20 or w < 80:
+        screen_message(stdscr, "Erro", "Terminal muito pequeno. Use ao menos 80x20.")
+        return
+    top = 2
+    toolbar = "F5 Iniciar | O=Origem | D=Destino | B=DBs | T=Tabelas | M=Modo | ESC Voltar"
+    safe_addstr(stdscr, top, 2, toolbar[: w - 4])
+
+    left_w = max(26, min(40, w // 3))
+    content_top = top + 1
+    content_bottom = h - 2
+    content_h = max(6, content_bottom - content_top)
+
+    right_x = left_w + 1
+    right_w = max(10, w - right_x - 1)
+    editor_h = max(6, content_h // 2)
+    result_h = max(4, content_h - editor_h - 1)
+
+    for y in range(content_top, content_top + content_h):
+        safe_addstr(stdscr, y, left_w, "|")
+
+    # Left panel
+    left_win = panel_window(stdscr, content_top, 1, content_h, left_w, "Ações", focused=True)
+    safe_addstr(left_win, 1, 2, "Espelhar Banco")
+
+    # Right top - config
+    cfg_win = panel_window(stdscr, content_top, right_x, editor_h, right_w, "Espelho")
+    lines = [
+        f"Origem:  {state.get('origin_label','-')}",
+        f"Destino: {state.get('dest_label','-')}",
+        f"DB Origem:  {state.get('origin_db','-')}",
+        f"DB Destino: {state.get('dest_db','-')}",
+        f"Modo: {state.get('mode','Database inteiro')}",
+        f"Tabelas: {state.get('tables_label','-')}",
+        "",
+        "Atalhos: O=Origem  D=Destino  B=DBs",
+        "         M=Modo    T=Tabelas  F5=Iniciar",
+    ]
+    max_lines = editor_h - 2
+    for i, line in enumerate(lines[:max_lines]):
+        safe_addstr(cfg_win, 1 + i, 2, line[: right_w - 4])
+
+    # Right bottom - progress
+    prog_win = panel_window(stdscr, content_top + editor_h + 1, right_x, result_h, right_w, "Progresso")
+    if progress:
+        safe_addstr(prog_win, 1, 2, "NÃO FECHAR O APP ATÉ FINALIZAR")
+        safe_addstr(prog_win, 2, 2, f"Tabela {progress['idx']}/{progress['total']}: {progress['table']}"[: right_w - 4])
+        total = progress["rows_total"]
+        copied = progress["rows_copied"]
+        percent = int((copied / total) * 100) if total else 0
+        bar_w = max(10, right_w - 6)
+        filled = int((percent / 100) * bar_w)
+        bar = "[" + "#" * filled + "-" * (bar_w - filled) + "]"
+        safe_addstr(prog_win, 4, 2, bar[: right_w - 4])
+        safe_addstr(prog_win, 5, 2, f"{copied}/{total} linhas ({percent}%)"[: right_w - 4])
+    else:
+        safe_addstr(prog_win, 1, 2, "Sem progresso ainda.")
+
+    stdscr.refresh()
+    left_win.refresh()
+    cfg_win.refresh()
+    prog_win.refresh()
+
+def format_duration(seconds):
+    seconds = int(max(0, seconds))
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{(seconds % 3600) // 60:02d}m"
+    return f"{seconds // 60:02d}:{seconds % 60:02d}"
+
+def render_progress(stdscr, title, origin_label, dest_label, table_name, table_idx, table_total, copied, total, eta=None):
+    stdscr.clear()
+    draw_header(stdscr, title)
+    h, w = stdscr.getmaxyx()
+    safe_addstr(stdscr, 2, 2, "NÃO FECHAR O APP ATÉ FINALIZAR")
+    safe_addstr(stdscr, 4, 2, f"Origem: {origin_label}"[: w - 4])
+    safe_addstr(stdscr, 5, 2, f"Destino: {dest_label}"[: w - 4])
+    safe_addstr(stdscr, 7, 2, f"Tabela {table_idx}/{table_total}: {table_name}"[: w - 4])
+    if total > 0:
+        percent = min(100, int((copied / total) * 100))
+    else:
+        percent = 0
+    bar_w = max(10, w - 10)
+    filled = int((percent / 100) * bar_w)
+    bar = "[" + "#" * filled + "-" * (bar_w - filled) + "]"
+    safe_addstr(stdscr, 9, 2, bar[: w - 4])
+    safe_addstr(stdscr, 10, 2, f"{copied}/{total} linhas ({percent}%)"[: w - 4])
+    if eta is not None:
+        safe_addstr(stdscr, 11, 2, f"Tempo restante estimado: {format_duration(eta)}"[: w - 4])
+    stdscr.refresh()
+
+# passthrough: o SELECT ja entrega o valor no formato que o INSERT aceita (texto exato ou
+# binario), sem Decimal/datetime/UUID intermediarios; o destino converte de volta.
+PASSTHROUGH_SELECT = {
+    "decimal": "CONVERT(VARCHAR(48), {})",
+    "numeric": "CONVERT(VARCHAR(48), {})",
+    "money": "CONVERT(VARCHAR(32), {}, 2)",
+    "smallmoney": "CONVERT(VARCHAR(32), {}, 2)",
+    "datetime": "CONVERT(VARCHAR(34), {}, 126)",
+    "datetime2": "CONVERT(VARCHAR(34), {}, 126)",
+    "datetimeoffset": "CONVERT(VARCHAR(34), {}, 126)",
+    "uniqueidentifier": "CONVERT(BINARY(16), {})",
+}
+
+def build_mirror_select(cols, alias=None, passthrough=False):
+    prefix = f"{alias}." if alias else ""
+    col_names = []
+    select_exprs = []
+    param_wrappers = []
+    for col in cols:
+        name, data_type, *_ = col
+        if col[7]:
+            continue
+        dt = (data_type or "").lower()
+        col_names.append(name)
+        if dt == "sql_variant":
+            select_exprs.append(f"CONVERT(NVARCHAR(MAX), {prefix}[{name}]) AS [{name}]")
+            param_wrappers.append("CONVERT(sql_variant, ?)")
+        elif dt == "xml":
+            select_exprs.append(f"CONVERT(NVARCHAR(MAX), {prefix}[{name}]) AS [{name}]")
+            param_wrappers.append("CONVERT(xml, ?)")
+        elif passthrough and dt in PASSTHROUGH_SELECT:
+            select_exprs.append(PASSTHROUGH_SELECT[dt].format(f"{prefix}[{name}]") + f" AS [{name}]")
+            param_wrappers.append("?")
+        else:
+            select_exprs.append(f"{prefix}[{name}]")
+            param_wrappers.append("?")
+    return col_names, select_exprs, param_wrappers
+
+# Acima disso um valor LOB sai do array binding do fast_executemany e vai por streaming
+LOB_INLINE_CHARS = 4000
+LOB_INLINE_BYTES = 8000
+
+def build_input_sizes(cols, passthrough=False):
+    # Tipos/tamanhos ODBC exatos por parametro (evita que o pyodbc adivinhe pela 1a linha).
+    # Retorna (sizes, lobs): lobs[i] = (tipo inline, tipo stream, limite) para colunas LOB.
+    # passthrough: os tipos de PASSTHROUGH_SELECT chegam como texto/binario.
+    sizes = []
+    lobs = []
+    for col in cols:
+        name, data_type, max_length, precision, scale = col[:5]
+        if col[7]:
+            continue
+        dt = (data_type or "").lower()
+        size = None
+        lob = None
+        if pyodbc is None:
+            pass
+        elif passthrough and dt == "uniqueidentifier":
+            size = (pyodbc.SQL_BINARY, 16, 0)
+        elif passthrough and dt in PASSTHROUGH_SELECT:
+            size = (pyodbc.SQL_VARCHAR, 48, 0)
+        elif dt == "bit":
+            size = (pyodbc.SQL_BIT, 0, 0)
+        elif dt == "tinyint":
+            size = (pyodbc.SQL_TINYINT, 0, 0)
+        elif dt == "smallint":
+            size = (pyodbc.SQL_SMALLINT, 0, 0)
+        elif dt == "int":
+            size = (pyodbc.SQL_INTEGER, 0, 0)
+        elif dt == "bigint":
+            size = (pyodbc.SQL_BIGINT, 0, 0)
+        elif dt in ("decimal", "numeric"):
+            size = (pyodbc.SQL_DECIMAL, int(precision), int(scale))
+        elif dt == "money":
+            size = (pyodbc.SQL_DECIMAL, 19, 4)
+        elif dt == "smallmoney":
+            size = (pyodbc.SQL_DECIMAL, 10, 4)
+        elif dt == "float":
+            size = (pyodbc.SQL_DOUBLE, 0, 0)
+        elif dt == "real":
+            size = (pyodbc.SQL_REAL, 0, 0)
+        elif dt == "date":
+            size = (pyodbc.SQL_TYPE_DATE, 10, 0)
+        elif dt == "datetime":
+            size = (pyodbc.SQL_TYPE_TIMESTAMP, 23, 3)
+        elif dt == "smalldatetime":
+            size = (pyodbc.SQL_TYPE_TIMESTAMP, 16, 0)
+        elif dt == "datetime2":
+            size = (pyodbc.SQL_TYPE_TIMESTAMP, 20 + int(scale) if scale else 19, int(scale))
+        elif dt == "time":
+            size = (getattr(pyodbc, "SQL_SS_TIME2", -154), 9 + int(scale) if scale else 8, int(scale))
+        elif dt == "uniqueidentifier":
+            size = (pyodbc.SQL_GUID, 16, 0)
+        elif dt in ("timestamp", "rowversion"):
+            size = (pyodbc.SQL_BINARY, 8, 0)
+        elif dt in ("char", "varchar") and max_length != -1:
+            size = (pyodbc.SQL_VARCHAR, int(max_length), 0)
+        elif dt in ("nchar", "nvarchar") and max_length != -1:
+            size = (pyodbc.SQL_WVARCHAR, int(max_length) // 2, 0)
+        elif dt in ("binary", "varbinary") and max_length != -1:
+            size = (pyodbc.SQL_VARBINARY, int(max_length), 0)
+        elif dt in ("nvarchar", "ntext", "xml", "sql_variant"):
+            # xml/sql_variant chegam como NVARCHAR(MAX) (CONVERT no SELECT)
+            lob = ((pyodbc.SQL_WVARCHAR, LOB_INLINE_CHARS, 0), (pyodbc.SQL_WLONGVARCHAR, 0, 0), LOB_INLINE_CHARS)
+        elif dt in ("varchar", "text"):
+            lob = ((pyodbc.SQL_VARCHAR, LOB_INLINE_BYTES, 0), (pyodbc.SQL_LONGVARCHAR, 0, 0), LOB_INLINE_BYTES)
+        elif dt in ("varbinary", "image"):
+            lob = ((pyodbc.SQL_VARBINARY, LOB_INLINE_BYTES, 0), (pyodbc.SQL_LONGVARBINARY, 0, 0), LOB_INLINE_BYTES)
+        # datetimeoffset, tipos CLR e alias: deixa o pyodbc decidir (None)
+        sizes.append(lob[0] if lob else size)
+        lobs.append(lob)
+    return sizes, lobs
+
+def lob_value_fits(value, limit):
+    if value is None or len(value) <= limit // 2:
+        return True
+    if isinstance(value, str):
+        if len(value) > limit:
+            return False
+        # caracteres fora do BMP ocupam 2 unidades UTF-16
+        return len(value.encode("utf-16-le")) // 2 <= limit
+    return len(value) <= limit
+
+def make_row_writer(conn, insert_sql, cols, passthrough=False):
+    # Linhas com LOB pequeno seguem no array binding (fast_executemany); linhas com
+    # algum LOB acima do limite vao para um cursor comum, onde o driver faz streaming.
+    sizes, lobs = build_input_sizes(cols, passthrough)
+    lob_idx = [i for i, lob in enumerate(lobs) if lob]
+    stream_sizes = [lob[1] if lob else size for size, lob in zip(sizes, lobs)]
+    use_sizes = pyodbc is not None and len(sizes) > 0
+    fast_cur = conn.cursor()
+    try:
+        fast_cur.fast_executemany = True
+    except Exception:
+        pass
+    stream_cur = None
+
+    def write(rows):
+        nonlocal stream_cur
+        if lob_idx:
+            inline = []
+            streamed = []
+            for r in rows:
+                if all(lob_value_fits(r[i], lobs[i][2]) for i in lob_idx):
+                    inline.append(r)
+                else:
+                    streamed.append(r)
+        else:
+            inline, streamed = rows, []
+        if inline:
+            if use_sizes:
+                fast_cur.setinputsizes(sizes)
+            fast_cur.executemany(insert_sql, inline)
+        if streamed:
+            if stream_cur is None:
+                stream_cur = conn.cursor()
+            if use_sizes:
+                stream_cur.setinputsizes(stream_sizes)
+            stream_cur.executemany(insert_sql, streamed)
+
+    return write
+
+def new_copy_metrics():
+    return {
+        "fetch_seconds": 0.0,
+        "insert_seconds": 0.0,
+        "wait_origin_seconds": 0.0,
+        "wait_dest_seconds": 0.0,
+        "batches": 0,
+        "retries": 0,
+    }
+
+def current_rss_bytes():
+    # Memoria residente do processo (Linux); 0 quando nao da para medir
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        return 0
+
+def estimate_rows_bytes(rows):
+    total = 0
+    for r in rows:
+        for v in r:
+            if isinstance(v, str):
+                total += 2 * len(v)
+            elif isinstance(v, (bytes, bytearray)):
+                total += len(v)
+            else:
+                total += 8
+    return total
+
+def copy_rows(cur, write, batch_size, report=None, copied=0, commit_every=0, commit=None, metrics=None, batch_bytes=0, max_rss=0):
+    # Pipeline: uma thread le da origem enquanto esta grava no destino (fila de 2 lotes).
+    # wait_origin = gravador parado esperando a origem; wait_dest = leitor parado com a fila cheia.
+    # batch_bytes: o numero de linhas por fetch acompanha o tamanho medio das linhas (LOB);
+    # max_rss: acima do limite o leitor espera a fila esvaziar e reduz o lote.
+    metrics = metrics if metrics is not None else new_copy_metrics()
+    pending = queue.Queue(maxsize=2)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                pending.put(item, timeout=0.2)
+                return
+            except queue.Full:
+                continue
+
+    def reader():
+        # adaptive: lote pelo tamanho das linhas; cap: teto pela memoria, que volta a subir
+        adaptive = min(batch_size, 50) if batch_bytes else batch_size
+        cap = batch_size
+        try:
+            while not stop.is_set():
+                if max_rss:
+                    rss = current_rss_bytes()
+                    if rss > max_rss:
+                        cap = max(1, min(cap, adaptive) // 2)
+                        started = time.perf_counter()
+                        while pending.qsize() and not stop.is_set():
+                            time.sleep(0.05)
+                        metrics["wait_dest_seconds"] += time.perf_counter() - started
+                    elif cap < batch_size and rss < max_rss * 0.8:
+                        cap = min(batch_size, cap * 2)
+                fetch_size = max(1, min(adaptive, cap))
+                started = time.perf_counter()
+                rows = cur.fetchmany(fetch_size)
+                metrics["fetch_seconds"] += time.perf_counter() - started
+                if batch_bytes and rows:
+                    avg = max(1, estimate_rows_bytes(rows) // len(rows))
+                    adaptive = max(1, min(batch_size, batch_bytes // avg))
+                started = time.perf_counter()
+                put(rows)
+                metrics["wait_dest_seconds"] += time.perf_counter() - started
+                if not rows:
+                    return
+        except Exception as e:
+            put(e)
+
+    thread = threading.Thread(target=reader, daemon=True)
+    thread.start()
+    batches = 0
+    try:
+        while True:
+            started = time.perf_counter()
+            rows = pending.get()
+            metrics["wait_origin_seconds"] += time.perf_counter() - started
+            if isinstance(rows, Exception):
+                raise rows
+            if not rows:
+                break
+            started = time.perf_counter()
+            write(rows)
+            copied += len(rows)
+            batches += 1
+            if commit and commit_every and batches % commit_every == 0:
+                commit()
+            metrics["insert_seconds"] += time.perf_counter() - started
+            metrics["batches"] += 1
+            if report:
+                report(copied)
+    finally:
+        stop.set()
+        thread.join()
+    return copied
+
+TRANSIENT_SQLSTATES = ("40001", "HYT00", "HYT01", "08S01", "08001")
+TRANSIENT_NATIVE_ERRORS = (1205,)
+NATIVE_ERROR_RE = re.compile(r"\((\d+)\)\s*\(SQL\w*\)")
+
+def is_transient_error(error):
+    # pyodbc: args[0] = SQLSTATE; o numero nativo vem como "(1205) (SQLExecDirectW)" na mensagem
+    args = getattr(error, "args", ())
+    if not args or not isinstance(args[0], str):
+        return False
+    if args[0] in TRANSIENT_SQLSTATES:
+        return True
+    message = args[1] if len(args) > 1 and isinstance(args[1], str) else ""
+    return any(int(n) in TRANSIENT_NATIVE_ERRORS for n in NATIVE_ERROR_RE.findall(message))
+
+def retry_transient(fn, metrics=None, attempts=3, delay=1.0):
+    # So para pontos onde repetir e seguro (nada foi consumido/gravado ainda)
+    for attempt in range(attempts):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == attempts - 1 or not is_transient_error(e):
+                raise
+            if metrics is not None:
+                metrics["retries"] += 1
+            log_event(f"Erro transitorio, tentando de novo: {e}")
+            time.sleep(delay * (attempt + 1))
+
+def execute_timed(cur, sql, params=(), metrics=None):
+    started = time.perf_counter()
+    retry_transient(lambda: cur.execute(sql, params) if params else cur.execute(sql), metrics)
+    if metrics is not None:
+        metrics["fetch_seconds"] += time.perf_counter() - started
+
+def plan_incremental_sync(origin_conn, schema, table, cols, previous):
+    # A marca d'agua nova e capturada ANTES da leitura: o que mudar durante a copia
+    # volta na proxima execucao (o MERGE e idempotente).
+    previous = previous or {}
+    plan = {"method": None, "delta": False, "keys": [], "since": None, "watermark": None}
+    keys = fetch_primary_key(origin_conn, schema, table)
+    if not keys:
+        return plan
+    plan["keys"] = keys
+    versions = fetch_change_tracking_versions(origin_conn, schema, table)
+    if versions:
+        current_version, min_valid = versions
+        plan["method"] = "change_tracking"
+        plan["watermark"] = {"method": "change_tracking", "version": current_version}
+        if previous.get("method") == "change_tracking":
+            since = int(previous.get("version", -1))
+            if since >= min_valid:
+                plan["delta"] = True
+                plan["since"] = since
+        return plan
+    rv_col = next((c[0] for c in cols if (c[1] or "").lower() in ("timestamp", "rowversion")), None)
+    if rv_col:
+        plan["method"] = "rowversion"
+        plan["column"] = rv_col
+        plan["watermark"] = {
+            "method": "rowversion",
+            "column": rv_col,
+            "value": fetch_min_active_rowversion(origin_conn).hex(),
+        }
+        if previous.get("method") == "rowversion" and previous.get("column") == rv_col and previous.get("value"):
+            plan["delta"] = True
+            plan["since"] = previous["value"]
+    return plan
+
+def sync_table_delta(origin_conn, dest_conn, schema, table, cols, plan, batch_size, report=None, metrics=None, passthrough=False):
+    table_ref = build_table_ref_full(schema, table)
+    keys = plan["keys"]
+    col_names, select_exprs, param_wrappers = build_mirror_select(cols, alias="src", passthrough=passthrough)
+    key_select = ", ".join(f"ct.[{k}]" for k in keys)
+    if plan["method"] == "change_tracking":
+        changes = f"CHANGETABLE(CHANGES {table_ref}, ?) AS ct"
+        on = " AND ".join(f"src.[{k}] = ct.[{k}]" for k in keys)
+        upsert_sql = f"SELECT {', '.join(select_exprs)} FROM {changes} JOIN {table_ref} AS src ON {on}"
+        upsert_params = (plan["since"],)
+        delete_sql = f"SELECT {key_select} FROM {changes} LEFT JOIN {table_ref} AS src ON {on} WHERE src.[{keys[0]}] IS NULL"
+        delete_params = (plan["since"],)
+        delete_missing = False
+    else:
+        # rowversion nao registra exclusoes: compara o conjunto de chaves
+        upsert_sql = (
+            f"SELECT {', '.join(select_exprs)} FROM {table_ref} AS src "
+            f"WHERE src.[{plan['column']}] >= CONVERT(binary(8), ?)"
+        )
+        upsert_params = (bytes.fromhex(plan["since"]),)
+        delete_sql = f"SELECT {key_select} FROM {table_ref} AS ct"
+        delete_params = ()
+        delete_missing = True
+
+    stage = "#jssms_stage"
+    keys_stage = "#jssms_keys"
+    key_cols = [c for c in cols if c[0] in keys]
+    identity_cols = [c[0] for c in cols if c[6] and not c[7]]
+    try:
+        create_stage_table(dest_conn, stage, cols)
+        cur = origin_conn.cursor()
+        execute_timed(cur, upsert_sql, upsert_params, metrics)
+        write = make_row_writer(dest_conn, build_insert_into(stage, col_names, param_wrappers), cols, passthrough)
+        copied = copy_rows(cur, write, batch_size, report, metrics=metrics)
+        if copied:
+            if identity_cols:
+                dest_conn.execute(f"SET IDENTITY_INSERT {table_ref} ON")
+            try:
+                dest_conn.execute(build_merge_sql(table_ref, stage, col_names, keys, identity_cols))
+            finally:
+                if identity_cols:
+                    dest_conn.execute(f"SET IDENTITY_INSERT {table_ref} OFF")
+
+        create_stage_table(dest_conn, keys_stage, key_cols)
+        cur = origin_conn.cursor()
+        execute_timed(cur, delete_sql, delete_params, metrics)
+        key_cols.sort(key=lambda c: keys.index(c[0]))
+        write = make_row_writer(dest_conn, build_insert_into(keys_stage, keys), key_cols)
+        key_count = copy_rows(cur, write, batch_size, metrics=metrics)
+        if key_count or delete_missing:
+            dest_conn.execute(build_delete_by_keys_sql(table_ref, keys_stage, keys, missing=delete_missing))
+    finally:
+        drop_stage_table(dest_conn, stage)
+        drop_stage_table(dest_conn, keys_stage)
+    return copied
+
+def plan_mirror_levels(tables, edges, sizes):
+    # Niveis topologicos pelas FKs: um nivel so depende dos anteriores.
+    # Tabelas em ciclo (ou que dependem de um ciclo) ficam num ultimo nivel, copiadas
+    # com as constraints desligadas no destino; auto-referencias tambem.
+    selected = set(tables)
+    parents = {t: set() for t in tables}
+    relaxed = set()
+    for child, parent in edges:
+        if child not in selected or parent not in selected:
+            continue
+        if child == parent:
+            relaxed.add(child)
+        else:
+            parents[child].add(parent)
+
+    def by_size(items):
+        return sorted(items, key=lambda t: sizes.get(t, {}).get("reserved_kb", 0), reverse=True)
+
+    levels = []
+    done = set()
+    remaining = set(tables)
+    while remaining:
+        ready = [t for t in remaining if parents[t] <= done]
+        if not ready:
+            break
+        levels.append(by_size(ready))
+        done.update(ready)
+        remaining.difference_update(ready)
+    if remaining:
+        levels.append(by_size(remaining))
+        relaxed.update(remaining)
+    return levels, relaxed
+
+def open_worker_conn(connect, database):
+    conn, err = connect()
+    if err:
+        raise RuntimeError(err)
+    conn.execute(f"USE [{database}]")
+    return conn
+
+SWAP_NEW_SUFFIX = "__jssms_new"
+SWAP_OLD_SUFFIX = "__jssms_old"
+
+def fetch_enabled_constraints(conn, schema, table):
+    # FKs e CHECKs ligados (is_disabled = 0) da tabela
+    sql = """
+    SELECT name FROM sys.foreign_keys WHERE parent_object_id = OBJECT_ID(?) AND is_disabled = 0
+    UNION ALL
+    SELECT name FROM sys.check_constraints WHERE parent_object_id = OBJECT_ID(?) AND is_disabled = 0
+    """
+    obj = f"{schema}.{table}"
+    cur = conn.cursor()
+    cur.execute(sql, (obj, obj))
+    return [r[0] for r in cur.fetchall()]
+
+def fetch_referencing_tables(conn, schema, table):
+    # Tabelas com FK apontando para esta (auto-referencia nao conta)
+    sql = """
+    SELECT DISTINCT OBJECT_SCHEMA_NAME(fk.parent_object_id) + '.' + OBJECT_NAME(fk.parent_object_id)
+    FROM sys.foreign_keys fk
+    WHERE fk.referenced_object_id = OBJECT_ID(?) AND fk.parent_object_id <> fk.referenced_object_id
+    """
+    cur = conn.cursor()
+    cur.execute(sql, (build_table_ref_full(schema, table),))
+    return [r[0] for r in cur.fetchall()]
+
+def drop_table_if_exists(conn, schema, table):
+    ref = build_table_ref_full(schema, table)
+    conn.execute(f"IF OBJECT_ID(?, 'U') IS NOT NULL DROP TABLE {ref}", (ref,))
+
+def prepare_swap_table(origin_conn, dest_conn, schema, table, stage, cols, options):
+    # Tabela nova com a estrutura da origem; indices e constraints vem depois da carga
+    drop_table_if_exists(dest_conn, schema, stage)
+    if not create_table_from_columns(dest_conn, schema, stage, cols):
+        raise RuntimeError("Falha ao criar tabela de carga no destino.")
+    ddl = {"pre_load": [], "clustered": [], "secondary": [], "constraints": [], "foreign_keys": [], "renames": []}
+    if options.get("copy_indexes"):
+        ddl = script_table_ddl(origin_conn, schema, table, options, target=stage, name_suffix=SWAP_NEW_SUFFIX)
+    return ddl, run_ddl_statements(dest_conn, ddl["pre_load"])
+
+def swap_in_table(conn, schema, table, stage, renames):
+    # Tudo metadado: a transacao segura o Sch-M so pelo tempo dos renames + DROP
+    old = table + SWAP_OLD_SUFFIX
+    drop_table_if_exists(conn, schema, old)
+    conn.autocommit = False
+    try:
+        cur = conn.cursor()
+        cur.execute("EXEC sp_rename ?, ?", (build_table_ref_full(schema, table), old))
+        cur.execute("EXEC sp_rename ?, ?", (build_table_ref_full(schema, stage), table))
+        cur.execute(f"DROP TABLE {build_table_ref_full(schema, old)}")
+        for name, original in renames:
+            # constraints cujo DDL falhou nao existem (ja estao no aviso de falhas)
+            obj = f"[{schema}].[{name}]"
+            cur.execute("IF OBJECT_ID(?) IS NOT NULL EXEC sp_rename ?, ?, 'OBJECT'", (obj, obj, original))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.autocommit = True
+
+def is_lob_column(col):
+    dt = (col[1] or "").lower()
+    return not col[7] and (col[2] == -1 or dt in ("text", "ntext", "image", "xml"))
+
+def plan_lob_chunks(cols, keys, chunk_bytes):
+    # Colunas (MAX) cujo valor grande e copiado em partes com UPDATE .WRITE depois do INSERT.
+    # .WRITE so existe para varchar/nvarchar/varbinary(max) e precisa da PK para achar a linha.
+    if not keys or chunk_bytes <= 0:
+        return []
+    chunked = []
+    for col in cols:
+        dt = (col[1] or "").lower()
+        if not col[7] and col[2] == -1 and dt in ("varchar", "nvarchar", "varbinary"):
+            chunked.append(col)
+    return chunked
+
+def build_lob_chunk_select(select_exprs, col_names, chunked, chunk_bytes):
+    # O valor acima do limite vem vazio (o INSERT cria a linha) e o tamanho vem numa coluna extra
+    exprs = list(select_exprs)
+    extra = []
+    for col in chunked:
+        name = col[0]
+        empty = "0x" if col[1].lower() == "varbinary" else ("N''" if col[1].lower() == "nvarchar" else "''")
+        exprs[col_names.index(name)] = f"CASE WHEN DATALENGTH([{name}]) > {chunk_bytes} THEN {empty} ELSE [{name}] END AS [{name}]"
+        extra.append(f"CASE WHEN DATALENGTH([{name}]) > {chunk_bytes} THEN DATALENGTH([{name}]) END")
+    return exprs + extra
+
+def stream_lob_chunks(origin_conn, dest_conn, schema, table, keys, oversized, chunk_bytes, metrics=None):
+    # oversized: [(valores da PK, coluna, DATALENGTH)]; cada parte vai com SUBSTRING + .WRITE (append)
+    table_ref = build_table_ref_full(schema, table)
+    where = " AND ".join(f"[{k}] = ?" for k in keys)
+    read_cur = origin_conn.cursor()
+    write_cur = dest_conn.cursor()
+    for key_values, col, length in oversized:
+        name = col[0]
+        wide = col[1].lower() == "nvarchar"
+        # SUBSTRING conta caracteres em nvarchar (2 bytes) e bytes nos demais
+        total = length // 2 if wide else length
+        step = chunk_bytes // 2 if wide else chunk_bytes
+        stream_type = {
+            "nvarchar": pyodbc.SQL_WLONGVARCHAR,
+            "varchar": pyodbc.SQL_LONGVARCHAR,
+            "varbinary": pyodbc.SQL_LONGVARBINARY,
+        }[col[1].lower()] if pyodbc is not None else None
+        for offset in range(0, total, step):
+            started = time.perf_counter()
+            read_cur.execute(f"SELECT SUBSTRING([{name}], ?, ?) FROM {table_ref} WHERE {where}", (offset + 1, step, *key_values))
+            row = read_cur.fetchone()
+            if metrics is not None:
+                metrics["fetch_seconds"] += time.perf_counter() - started
+            if row is None or row[0] is None:
+                break
+            started = time.perf_counter()
+            if stream_type is not None:
+                write_cur.setinputsizes([(stream_type, 0, 0)] + [None] * len(keys))
+            write_cur.execute(f"UPDATE {table_ref} SET [{name}].WRITE(?, NULL, NULL) WHERE {where}", (row[0], *key_values))
+            if metrics is not None:
+                metrics["insert_seconds"] += time.perf_counter() - started
+
+# Semente fixa: o TABLESAMPLE do pai e reavaliado igual quando os filhos seguem a FK
+FILTER_SAMPLE_SEED = 20240601
+
+def parse_row_limit(text):
+    # "1000", "10%", "10 PERCENT", "500 ROWS" -> (numero, percentual)
+    value = (text or "").strip().upper().replace("%", " PERCENT")
+    if not value:
+        return None
+    parts = value.split()
+    if len(parts) > 2 or (len(parts) == 2 and parts[1] not in ("PERCENT", "ROWS")):
+        raise ValueError(f"Limite invalido: {text}")
+    number = float(parts[0])
+    percent = len(parts) == 2 and parts[1] == "PERCENT"
+    if number <= 0 or (percent and number > 100):
+        raise ValueError(f"Limite invalido: {text}")
+    return (number if percent else int(number)), percent
+
+def format_table_filter(filt):
+    parts = []
+    if filt.get("where"):
+        parts.append(f"WHERE {filt['where']}")
+    if filt.get("top"):
+        parts.append(f"TOP {filt['top']}")
+    if filt.get("sample"):
+        parts.append(f"TABLESAMPLE {filt['sample']}")
+    return " | ".join(parts)
+
+def build_filtered_sources(conn, tables, filters, follow_fks=False):
+    # {tabela: tabela derivada com o subconjunto a copiar}; tabelas sem filtro ficam de fora.
+    # Com follow_fks a filha so leva linhas cujo pai (filtrado) tambem vai.
+    selected = set(tables)
+    parent_fks = {}
+    if follow_fks:
+        for t in tables:
+            fks = fetch_foreign_keys(conn, *split_table_name(t))
+            parent_fks[t] = [fk for fk in fks if f"{fk['ref_schema']}.{fk['ref_table']}" in selected]
+    sources = {}
+    visiting = set()
+
+    def source(t):
+        if t in sources:
+            return sources[t]
+        if t in visiting:
+            return None  # ciclo: o pai e copiado sem restringir a filha
+        visiting.add(t)
+        schema, table = split_table_name(t)
+        filt = filters.get(t) or {}
+        conds = [f"({filt['where']})"] if filt.get("where") else []
+        for fk in parent_fks.get(t, []):
+            parent = f"{fk['ref_schema']}.{fk['ref_table']}"
+            if parent == t:
+                continue
+            parent_source = source(parent)
+            if not parent_source:
+                continue
+            on = " AND ".join(f"p.[{rc}] = src.[{c}]" for c, rc in zip(fk["cols"], fk["ref_cols"]))
+            nulls = " OR ".join(f"src.[{c}] IS NULL" for c in fk["cols"])
+            conds.append(f"({nulls} OR EXISTS (SELECT 1 FROM {parent_source} AS p WHERE {on}))")
+        visiting.discard(t)
+        top = parse_row_limit(filt.get("top"))
+        sample = parse_row_limit(filt.get("sample"))
+        if not (conds or top or sample):
+            sources[t] = None
+            return None
+        select = "SELECT "
+        order = ""
+        if top:
+            number, percent = top
+            select += f"TOP ({number}){' PERCENT' if percent else ''} "
+            # TOP deterministico: a mesma amostra quando reavaliada pelas filhas
+            keys = fetch_primary_key(conn, schema, table)
+            if keys:
+                order = " ORDER BY " + ", ".join(f"src.[{k}]" for k in keys)
+        sql = f"{select}src.* FROM {build_table_ref_full(schema, table)} AS src"
+        if sample:
+            number, percent = sample
+            sql += f" TABLESAMPLE ({number} {'PERCENT' if percent else 'ROWS'}) REPEATABLE ({FILTER_SAMPLE_SEED})"
+        if conds:
+            sql += " WHERE " + " AND ".join(conds)
+        sources[t] = f"({sql}{order})"
+        return sources[t]
+
+    for t in tables:
+        source(t)
+    return {t: s for t, s in sources.items() if s}
+
+def screen_table_filter(stdscr, table, filt):
+    # Retorna o filtro editado ({} = sem filtro) ou None se cancelado
+    fields = [
+        ("WHERE", "where", "ex.: created_at >= '2024-01-01' AND status = 1"),
+        ("TOP", "top", "ex.: 1000 ou 10%"),
+        ("TABLESAMPLE", "sample", "ex.: 5 PERCENT ou 10000 ROWS"),
+    ]
+    filt = dict(filt or {})
+    idx = 0
+    while True:
+        stdscr.clear()
+        draw_header(stdscr, f"Filtro - {table}")
+        h, w = stdscr.getmaxyx()
+        for i, (label, key, hint) in enumerate(fields):
+            attr = curses.A_REVERSE if i == idx else 0
+            safe_addstr(stdscr, 3 + i * 2, 4, f"{label}: {filt.get(key, '')}"[: w - 6], attr)
+            safe_addstr(stdscr, 4 + i * 2, 6, hint[: w - 8])
+        safe_addstr(stdscr, h - 2, 2, "Enter = editar | DEL = limpar | F10 = salvar | ESC = cancelar"[: w - 4])
+        stdscr.refresh()
+        ch = stdscr.getch()
+        if ch in (27,):
+            return None
+        if ch in (curses.KEY_UP,):
+            idx = (idx - 1) % len(fields)
+        elif ch in (curses.KEY_DOWN,):
+            idx = (idx + 1) % len(fields)
+        elif ch in (curses.KEY_DC, curses.KEY_BACKSPACE, 127, 8):
+            filt.pop(fields[idx][1], None)
+        elif ch in (curses.KEY_ENTER, 10, 13):
+            label, key, _ = fields[idx]
+            value = prompt_input(stdscr, f"{label}:", filt.get(key, ""))
+            if value is None:
+                continue
+            value = value.strip()
+            if value and key in ("top", "sample"):
+                try:
+                    parse_row_limit(value)
+                except ValueError as e:
+                    screen_message(stdscr, "Erro", str(e))
+                    continue
+            if value:
+                filt[key] = value
+            else:
+                filt.pop(key, None)
+        elif ch == curses.KEY_F10:
+            return {k: v for k, v in filt.items() if v}
+
+def mirror_table(job, t, origin_conn, dest_conn, render=None):
+    options = job["options"]
+    lock = job["lock"]
+    sizes = job["sizes"]
+    log_stats = job["log_stats"]
+    incremental = bool(options.get("incremental"))
+    bulk_load = bool(options.get("bulk_load"))
+    commit_batches = max(1, int(options.get("commit_batches") or 1))
+    batch_size = 1000
+    schema, table = split_table_name(t)
+    estimated = sizes.get(t, {}).get("rows", 0)
+    metrics = new_copy_metrics()
+    result = {"mode": "completa", "rows": 0, "status": "erro", "error": ""}
+    started = time.time()
+    load_table = table
+    with lock:
+        job["table_idx"] += 1
+        job["active"][t] = [0, estimated]
+
+    def report(copied, total=0):
+        with lock:
+            job["active"][t] = [copied, total]
+        if render:
+            render()
+
+    def commit_batch():
+        dest_conn.commit()
+        usage = fetch_log_usage(dest_conn)
+        if usage:
+            with lock:
+                log_stats["peak_used"] = max(log_stats.get("peak_used", 0), usage[0])
+
+    passthrough = bool(options.get("passthrough_types"))
+    try:
+        cols = fetch_columns_detail(origin_conn, schema, table)
+        col_names, select_exprs, param_wrappers = build_mirror_select(cols, passthrough=passthrough)
+        if not col_names:
+            result["status"] = "ok"
+            return
+        select_cols = ", ".join(select_exprs)
+        source = job["sources"].get(t)
+        if source:
+            select_sql = f"SELECT {select_cols} FROM {source} AS src"
+        else:
+            select_sql = f"SELECT {select_cols} FROM {build_table_ref_full(schema, table)}"
+        existed = table_exists(dest_conn, schema, table)
+        if not existed:
+            created = create_table_from_columns(dest_conn, schema, table, cols)
+            if not created:
+                raise RuntimeError("Falha ao criar tabela no destino.")
+            if options.get("copy_indexes"):
+                ddl = script_table_ddl(origin_conn, schema, table, options)
+                failures = run_ddl_statements(dest_conn, ddl["pre_load"])
+                with lock:
+                    job["ddl_failures"] += failures
+                    for phase in job["post_load"]:
+                        job["post_load"][phase] += ddl[phase]
+        # troca atomica: so para tabelas que ja existem e que nenhuma FK referencia
+        # (sp_rename deixaria as FKs das filhas apontando para a tabela antiga)
+        swap = bool(options.get("swap_load")) and existed
+        if swap and not options.get("copy_indexes"):
+            # sem indices/constraints a tabela nova seria um heap no lugar da atual
+            log_event(f"{t}: troca exige copia de indices; carga direta em vez de troca")
+            swap = False
+        if swap:
+            referenced = fetch_referencing_tables(dest_conn, schema, table)
+            if referenced:
+                log_event(f"{t}: referenciada por {', '.join(referenced)}; carga direta em vez de troca")
+                swap = False
+        plan = None
+        if incremental and source:
+            # filtro sem delta: o subconjunto substitui o conteudo atual
+            if existed and not swap:
+                truncate_table(dest_conn, schema, table)
+        elif incremental:
+            state_key = mirror_state_key(job["origin_label"], job["origin_db"], job["dest_label"], job["dest_db"], t)
+            with lock:
+                previous = job["sync_state"].get(state_key)
+            plan = plan_incremental_sync(origin_conn, schema, table, cols, previous)
+            if plan["delta"] and existed:
+                report(0)
+                result["mode"] = "delta"
+                result["rows"] = sync_table_delta(origin_conn, dest_conn, schema, table, cols, plan, batch_size, report, metrics, passthrough)
+                result["status"] = "ok"
+                with lock:
+                    job["sync_state"][state_key] = plan["watermark"]
+                    save_mirror_state(job["sync_state"])
+                    # o delta nao percorre a tabela: conta como concluida na ETA
+                    job["rows_done"] += estimated
+                return
+            if existed and not swap:
+                # sem marca d'agua valida: copia completa a partir de uma tabela vazia
+                truncate_table(dest_conn, schema, table)
+        swap_ddl = None
+        if swap:
+            load_table = table + SWAP_NEW_SUFFIX
+            swap_ddl, failures = prepare_swap_table(origin_conn, dest_conn, schema, table, load_table, cols, options)
+            with lock:
+                job["ddl_failures"] += failures
+        insert_sql = build_insert_sql(schema, load_table, col_names, param_wrappers, "TABLOCK" if bulk_load else None)
+        total = 0 if source else estimated
+        if options.get("exact_count") or (t not in sizes and not source):
+            try:
+                total = origin_conn.execute(f"SELECT COUNT_BIG(*) FROM {source or build_table_ref_full(schema, table)}{' AS src' if source else ''}").fetchone()[0]
+            except Exception:
+                total = 0
+        has_lob = any(is_lob_column(c) for c in cols)
+        chunk_bytes = int(options.get("lob_chunk_mb") or 0) * 1024 * 1024
+        keys = fetch_primary_key(origin_conn, schema, table) if has_lob and chunk_bytes else []
+        chunked = plan_lob_chunks(cols, keys, chunk_bytes)
+        oversized = []
+        write = make_row_writer(dest_conn, insert_sql, cols, passthrough)
+        if chunked:
+            key_pos = [col_names.index(k) for k in keys]
+            exprs = build_lob_chunk_select(select_exprs, col_names, chunked, chunk_bytes)
+            select_sql = f"SELECT {', '.join(exprs)} FROM {source + ' AS src' if source else build_table_ref_full(schema, table)}"
+            insert_rows = write
+            width = len(col_names)
+
+            def write(rows):
+                # separa os tamanhos das colunas extras e guarda quais valores faltam copiar
+                for r in rows:
+                    for col, length in zip(chunked, r[width:]):
+                        if length is not None:
+                            oversized.append((tuple(r[i] for i in key_pos), col, length))
+                insert_rows([tuple(r[:width]) for r in rows])
+
+        cur = origin_conn.cursor()
+        execute_timed(cur, select_sql, metrics=metrics)
+        has_identity = any(c[6] for c in cols if not c[7])
+        if has_identity:
+            dest_conn.execute(f"SET IDENTITY_INSERT {build_table_ref_full(schema, load_table)} ON")
+        report(0, total)
+        if bulk_load:
+            # TABLOCK + transacoes de N lotes: em SIMPLE/BULK_LOGGED permite minimal
+            # logging e o log pode ser reaproveitado entre os commits
+            dest_conn.autocommit = False
+        try:
+            copied = copy_rows(
+                cur,
+                write,
+                batch_size,
+                lambda copied: report(copied, total),
+                commit_every=commit_batches if bulk_load else 0,
+                commit=commit_batch,
+                metrics=metrics,
+                batch_bytes=int(options.get("lob_batch_mb") or 0) * 1024 * 1024 if has_lob else 0,
+                max_rss=int(options.get("max_rss_mb") or 0) * 1024 * 1024,
+            )
+            result["rows"] = copied
+            if oversized:
+                stream_lob_chunks(origin_conn, dest_conn, schema, load_table, keys, oversized, chunk_bytes, metrics)
+            if bulk_load:
+                commit_batch()
+        except Exception:
+            if bulk_load:
+                dest_conn.rollback()
+            raise
+        finally:
+            if bulk_load:
+                dest_conn.autocommit = True
+        if has_identity:
+            dest_conn.execute(f"SET IDENTITY_INSERT {build_table_ref_full(schema, load_table)} OFF")
+        if swap_ddl:
+            statements = swap_ddl["clustered"] + swap_ddl["secondary"] + swap_ddl["constraints"]
+            statements += [sql for _, sql in swap_ddl["foreign_keys"]]
+            failures = run_ddl_statements(dest_conn, statements)
+            with lock:
+                job["ddl_failures"] += failures
+            swap_in_table(dest_conn, schema, table, load_table, swap_ddl["renames"])
+            load_table = table
+        with lock:
+            job["rows_done"] += copied
+            job["bytes_done"] += (sizes.get(t, {}).get("data_kb", 0) + sizes.get(t, {}).get("lob_kb", 0)) * 1024
+            if plan and plan["watermark"]:
+                job["sync_state"][state_key] = plan["watermark"]
+                save_mirror_state(job["sync_state"])
+        result["status"] = "ok"
+    except Exception as e:
+        result["error"] = str(e)
+        if load_table != table:
+            # a tabela em uso no destino fica intacta
+            try:
+                drop_table_if_exists(dest_conn, schema, load_table)
+            except Exception:
+                pass
+        raise
+    finally:
+        with lock:
+            job["active"].pop(t, None)
+            record = build_table_metrics(job, t, result, metrics, time.time() - started)
+            job["metrics"].append(record)
+            append_mirror_metrics(record)
+
+def build_table_metrics(job, t, result, metrics, seconds):
+    size = job["sizes"].get(t, {})
+    rows = result["rows"]
+    # bytes estimados pelas paginas de dados/LOB (proporcional as linhas copiadas)
+    table_bytes = (size.get("data_kb", 0) + size.get("lob_kb", 0)) * 1024
+    est_bytes = int(table_bytes * rows / size["rows"]) if size.get("rows") else 0
+    return {
+        "ts": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "run_id": job["run_id"],
+        "origin": f"{job['origin_label']}/{job['origin_db']}",
+        "dest": f"{job['dest_label']}/{job['dest_db']}",
+        "table": t,
+        "mode": result["mode"],
+        "status": result["status"],
+        "error": result["error"],
+        "rows": rows,
+        "bytes_est": est_bytes,
+        "seconds": round(seconds, 3),
+        "fetch_seconds": round(metrics["fetch_seconds"], 3),
+        "insert_seconds": round(metrics["insert_seconds"], 3),
+        "wait_origin_seconds": round(metrics["wait_origin_seconds"], 3),
+        "wait_dest_seconds": round(metrics["wait_dest_seconds"], 3),
+        "batches": metrics["batches"],
+        "retries": metrics["retries"],
+        "rows_per_s": round(rows / seconds, 1) if seconds > 0 else 0,
+        "bytes_per_s": round(est_bytes / seconds, 1) if seconds > 0 else 0,
+    }
+
+def run_mirror_level_parallel(job, level, workers, origin_connect, dest_connect, render):
+    # Cada thread abre o seu par de conexoes (origem/destino) e o reaproveita no nivel.
+    local = threading.local()
+    lock = job["lock"]
+    opened = []
+
+    def run(t):
+        if job["cancel"]:
+            return
+        pair = getattr(local, "pair", None)
+        if pair is None:
+            origin = retry_transient(lambda: open_worker_conn(origin_connect, job["read_db"]))
+            with lock:
+                opened.append(origin)
+            dest = retry_transient(lambda: open_worker_conn(dest_connect, job["dest_db"]))
+            with lock:
+                opened.append(dest)
+            pair = local.pair = (origin, dest)
+        mirror_table(job, t, pair[0], pair[1])
+
+    error = None
+    try:
+        with ThreadPoolExecutor(max_workers=min(workers, len(level))) as pool:
+            futures = {pool.submit(run, t): t for t in level}
+            pending = set(futures)
+            while pending:
+                finished, pending = wait(pending, timeout=0.25)
+                for fut in finished:
+                    try:
+                        fut.result()
+                    except Exception as e:
+                        if error is None:
+                            error = (futures[fut], e)
+                            job["cancel"] = True
+                render()
+    finally:
+        for conn in opened:
+            try:
+                conn.close()
+            except Exception:
+                pass
+    return error
+
+def curses_mirror_sink(stdscr, origin_label, dest_label, progress_cb=None):
+    # Saida do espelhamento na tela (modo avancado)
+    title = "Modo Avançado - Espelhar Banco"
+
+    def progress(label, idx, total, copied, total_rows, eta=None):
+        if progress_cb:
+            progress_cb(label, idx, total, copied, total_rows, eta=eta)
+        else:
+            render_progress(stdscr, title, origin_label, dest_label, label, idx, total, copied, total_rows, eta=eta)
+
+    def status(text):
+        screen_message(stdscr, title, text, pause=False)
+        stdscr.refresh()
+
+    def message(msg_title, text, level="info"):
+        screen_message(stdscr, msg_title, text)
+
+    return {
+        "progress": progress,
+        "status": status,
+        "message": message,
+        "report": lambda records: screen_mirror_report(stdscr, records),
+    }
+
+def json_mirror_sink(stream=None, interval=1.0):
+    # Saida sem curses: um objeto JSON por linha (progress/status/message/table).
+    # "levels" guarda os niveis de mensagem emitidos (para o codigo de saida).
+    stream = stream or sys.stdout
+    lock = threading.Lock()
+    state = {"last": 0.0, "label": None}
+    levels = set()
+
+    def emit(event, **data):
+        line = json.dumps({"event": event, "ts": datetime.now().isoformat(timespec="seconds"), **data}, ensure_ascii=False, default=str)
+        with lock:
+            stream.write(line + "\n")
+            stream.flush()
+
+    def progress(label, idx, total, copied, total_rows, eta=None):
+        now = time.time()
+        if label == state["label"] and now - state["last"] < interval:
+            return
+        state["last"] = now
+        state["label"] = label
+        emit("progress", table=label, table_idx=idx, tables=total, rows=copied, rows_total=total_rows, eta_seconds=round(eta) if eta is not None else None)
+
+    def message(title, text, level="info"):
+        levels.add(level)
+        emit("message", level=level, title=title, text=text)
+
+    def report(records):
+        for record in records:
+            emit("table", **record)
+
+    return {
+        "progress": progress,
+        "status": lambda text: emit("status", text=text),
+        "message": message,
+        "report": report,
+        "levels": levels,
+    }
+
+def create_database_snapshot(conn, database, run_id):
+    # Snapshot com um arquivo esparso ao lado de cada arquivo de dados da origem
+    cur = conn.cursor()
+    cur.execute("SELECT name, physical_name FROM sys.master_files WHERE database_id = DB_ID(?) AND type = 0", (database,))
+    files = cur.fetchall()
+    if not files:
+        raise RuntimeError(f"Arquivos de dados de {database} nao encontrados.")
+    name = f"{database}_jssms_snap_{run_id}"
+    specs = ", ".join(
+        f"(NAME = [{logical.replace(']', ']]')}], FILENAME = N'{(physical + '.' + run_id + '.ss').replace(chr(39), chr(39) * 2)}')"
+        for logical, physical in files
+    )
+    conn.execute(f"CREATE DATABASE [{name}] ON {specs} AS SNAPSHOT OF [{database}]")
+    return name
+
+def begin_consistent_reads(conn, database, mode, run_id):
+    # Todas as tabelas lidas no mesmo ponto no tempo e sem locks compartilhados:
+    # "snapshot" = uma transacao SNAPSHOT na conexao da origem (leitura sequencial);
+    # "db_snapshot" = database snapshot do job, que as conexoes paralelas tambem leem.
+    reads = {"mode": mode, "db": database, "snapshot_db": None}
+    if mode == "db_snapshot":
+        reads["snapshot_db"] = reads["db"] = create_database_snapshot(conn, database, run_id)
+        conn.execute(f"USE [{reads['db']}]")
+    elif mode == "snapshot":
+        state = conn.execute("SELECT snapshot_isolation_state FROM sys.databases WHERE name = ?", (database,)).fetchone()
+        if not state or state[0] != 1:
+            raise RuntimeError(f"ALLOW_SNAPSHOT_ISOLATION esta desligado em {database} (use db_snapshot).")
+        conn.execute("SET TRANSACTION ISOLATION LEVEL SNAPSHOT")
+        conn.autocommit = False
+    return reads
+
+def end_consistent_reads(conn, database, reads):
+    try:
+        if reads["mode"] == "snapshot":
+            conn.rollback()  # so houve leitura
+            conn.autocommit = True
+            conn.execute("SET TRANSACTION ISOLATION LEVEL READ COMMITTED")
+        if reads["snapshot_db"]:
+            conn.execute(f"USE [{database}]")
+            conn.execute(f"DROP DATABASE [{reads['snapshot_db']}]")
+    except Exception as e:
+        log_event(f"Falha ao encerrar a leitura consistente ({reads['mode']}): {e}")
+
+def mirror_tables(sink, origin_conn, dest_conn, origin_db, dest_db, tables, origin_label, dest_label, options=None, dest_connect=None, origin_connect=None):
+    options = options or {}
+    try:
+        origin_conn.execute(f"USE [{origin_db}]")
+        dest_conn.execute(f"USE [{dest_db}]")
+    except Exception as e:
+        sink["message"]("Erro", str(e), "error")
+        return False
+    # sufixo aleatorio: execucoes no mesmo segundo nao disputam o nome do snapshot
+    run_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+    mode = options.get("consistent_reads") or "off"
+    try:
+        reads = begin_consistent_reads(origin_conn, origin_db, mode, run_id)
+    except Exception as e:
+        sink["message"]("Erro", f"Leitura consistente ({mode}): {e}", "error")
+        return False
+    try:
+        return copy_mirror_tables(sink, origin_conn, dest_conn, origin_db, dest_db, tables, origin_label, dest_label, options, dest_connect, origin_connect, run_id, reads)
+    finally:
+        end_consistent_reads(origin_conn, origin_db, reads)
+
+def copy_mirror_tables(sink, origin_conn, dest_conn, origin_db, dest_db, tables, origin_label, dest_label, options, dest_connect, origin_connect, run_id, reads):
+    try:
+        sizes = fetch_table_sizes(origin_conn)
+    except Exception as e:
+        log_event(f"Estimativa de linhas indisponivel: {e}")
+        sizes = {}
+    # maiores primeiro: a ETA estabiliza cedo e nao sobra uma tabela gigante no fim
+    tables = sorted(tables, key=lambda t: sizes.get(t, {}).get("reserved_kb", 0), reverse=True)
+    try:
+        sources = build_filtered_sources(origin_conn, tables, options.get("filters") or {}, options.get("follow_fks"))
+    except Exception as e:
+        sink["message"]("Erro", f"Filtro invalido: {e}", "error")
+        return False
+    job = {
+        "options": options,
+        "origin_db": origin_db,
+        "dest_db": dest_db,
+        "origin_label": origin_label,
+        "dest_label": dest_label,
+        "sizes": sizes,
+        "sources": sources,
+        "sync_state": load_mirror_state() if options.get("incremental") else {},
+        "post_load": {"clustered": [], "secondary": [], "constraints": [], "foreign_keys": []},
+        "ddl_failures": [],
+        "log_stats": {},
+        "lock": threading.Lock(),
+        "active": {},  # tabela -> [copiadas, total]
+        "table_idx": 0,
+        "rows_done": 0,
+        "bytes_done": 0,
+        "metrics": [],
+        "run_id": run_id,
+        "read_db": reads["db"],
+        "rows_all": sum(sizes.get(t, {}).get("rows", 0) for t in tables),
+        "started": time.time(),
+        "cancel": False,
+    }
+    log_stats = job["log_stats"]
+    if options.get("bulk_load"):
+        log_stats["recovery"] = fetch_recovery_model(dest_conn)
+        log_stats["before"] = fetch_log_usage(dest_conn)
+        log_stats["peak_used"] = log_stats["before"][0] if log_stats["before"] else 0
+    total_tables = len(tables)
+
+    def render():
+        with job["lock"]:
+            active = {k: list(v) for k, v in job["active"].items()}
+            done = job["rows_done"]
+            idx = job["table_idx"]
+        copied = sum(v[0] for v in active.values())
+        total = sum(v[1] for v in active.values())
+        if len(active) > 1:
+            label = f"{len(active)} em paralelo: " + ", ".join(sorted(active))
+        else:
+            label = next(iter(active), "")
+        done += copied
+        elapsed = time.time() - job["started"]
+        eta = None
+        if done and elapsed > 0 and job["rows_all"]:
+            eta = max(0, job["rows_all"] - done) / (done / elapsed)
+        sink["progress"](label, idx, total_tables, copied, total, eta=eta)
+
+    levels, relaxed = [tables], set()
+    if options.get("fk_order"):
+        try:
+            levels, relaxed = plan_mirror_levels(tables, fetch_foreign_key_graph(origin_conn), sizes)
+        except Exception as e:
+            log_event(f"Ordem por FKs indisponivel: {e}")
+    # ciclos/auto-referencias: desliga as constraints das tabelas que ja existem no destino.
+    # So as que estao ligadas agora; as ja desligadas antes da execucao ficam como estavam.
+    relaxed = [t for t in sorted(relaxed) if table_exists(dest_conn, *split_table_name(t))]
+    disabled = []
+    for t in relaxed:
+        ref = build_table_ref_full(*split_table_name(t))
+        for name in fetch_enabled_constraints(dest_conn, *split_table_name(t)):
+            dest_conn.execute(f"ALTER TABLE {ref} NOCHECK CONSTRAINT [{name}]")
+            disabled.append((t, ref, name))
+
+    workers = max(1, int(options.get("parallel_tables") or 1))
+    # a transacao SNAPSHOT e de uma conexao so; para ler em paralelo use db_snapshot
+    parallel = workers > 1 and origin_connect is not None and dest_connect is not None and reads["mode"] != "snapshot"
+    error = None
+    try:
+        for level in levels:
+            if parallel and len(level) > 1:
+                error = run_mirror_level_parallel(job, level, workers, origin_connect, dest_connect, render)
+            else:
+                for t in level:
+                    try:
+                        mirror_table(job, t, origin_conn, dest_conn, render)
+                    except Exception as e:
+                        error = (t, e)
+                        break
+            if error:
+                break
+    finally:
+        for t, ref, name in disabled:
+            # a tabela pode ter sido recriada na carga (constraint nova ja nasce ligada)
+            guard = "IF EXISTS (SELECT 1 FROM sys.objects WHERE parent_object_id = OBJECT_ID(?) AND name = ?) "
+            params = (t, name)
+            try:
+                dest_conn.execute(guard + f"ALTER TABLE {ref} WITH CHECK CHECK CONSTRAINT [{name}]", params)
+            except Exception as e:
+                # religa mesmo sem validar (constraint fica "not trusted")
+                job["ddl_failures"].append((f"ALTER TABLE {ref} WITH CHECK CHECK CONSTRAINT [{name}]", str(e)))
+                try:
+                    dest_conn.execute(guard + f"ALTER TABLE {ref} CHECK CONSTRAINT [{name}]", params)
+                except Exception:
+                    pass
+    if job["metrics"]:
+        sink["report"](job["metrics"])
+    if error:
+        sink["message"]("Erro", f"{error[0]}\n{error[1]}", "error")
+        return False
+    if job["bytes_done"]:
+        # alimenta a estimativa de duracao do planejador nas proximas execucoes
+        record_mirror_run(origin_label, dest_label, job["bytes_done"], job["rows_done"], time.time() - job["started"])
+    ddl_failures = job["ddl_failures"]
+    if options.get("bulk_load") and log_stats.get("before"):
+        sink["message"]("Carga bulk - Log do destino", "\n".join(format_log_report(log_stats, fetch_log_usage(dest_conn))))
+    post_load = job["post_load"]
+    if any(post_load.values()):
+        ddl_failures += build_post_load_ddl(sink, dest_conn, dest_db, post_load, options, dest_connect)
+    if ddl_failures:
+        for sql, err in ddl_failures:
+            log_event(f"Falha no DDL do espelho: {sql}\n{err}")
+        lines = [f"{len(ddl_failures)} comando(s) de indice/constraint falharam (detalhes no log):", ""]
+        lines += [f"- {sql[:120]}" for sql, _ in ddl_failures]
+        sink["message"]("Aviso", "\n".join(lines), "warning")
+    return True
+
+COMPARE_FANOUT = 16
+COMPARE_LEAF_ROWS = 2000
+COMPARE_MAX_MODULUS = 1 << 24
+COMPARE_INT_TYPES = ("tinyint", "smallint", "int", "bigint")
+
+def build_binary_value_expr(col):
+    # Bytes do valor independentes de collation: textos viram UTF-16 (NVARCHAR) antes do
+    # VARBINARY; cada valor leva marca de NULL e tamanho para nao colidir ao concatenar.
+    name = col[0]
+    dt = (col[1] or "").lower()
+    if dt in ("char", "varchar", "text", "nchar", "nvarchar", "ntext", "xml", "sql_variant"):
+        value = f"CONVERT(VARBINARY(MAX), CONVERT(NVARCHAR(MAX), [{name}]))"
+    else:
+        value = f"CONVERT(VARBINARY(MAX), [{name}])"
+    return f"ISNULL(0x01 + CAST(DATALENGTH({value}) AS BINARY(4)) + {value}, 0x00)"
+
+def build_row_hash_expr(cols):
+    # SHA2_256 por linha (HASHBYTES sem limite de 8000 bytes pede SQL Server 2016+);
+    # rowversion fica de fora (o valor e gerado em cada servidor)
+    exprs = [
+        build_binary_value_expr(col)
+        for col in cols
+        if not col[7] and (col[1] or "").lower() not in ("timestamp", "rowversion")
+    ]
+    return f"HASHBYTES('SHA2_256', {' + '.join(exprs)})"
+
+def build_key_hash_expr(cols, keys):
+    # Balde das chaves nao inteiras: 4 bytes do SHA2_256 das chaves (mesmo balde nas duas
+    # pontas mesmo com collations diferentes, ao contrario do CHECKSUM)
+    by_name = {c[0]: c for c in cols}
+    parts = " + ".join(build_binary_value_expr(by_name.get(k, (k, ""))) for k in keys)
+    return f"CAST(SUBSTRING(HASHBYTES('SHA2_256', {parts}), 1, 4) AS BIGINT)"
+
+def build_segment_where(segment, keys, key_hash):
+    # segmento = faixa da 1a coluna da chave e/ou particao por hash das chaves (resto r de M)
+    parts = []
+    params = []
+    if segment.get("range"):
+        lo, hi = segment["range"]
+        parts.append(f"[{keys[0]}] BETWEEN ? AND ?")
+        params += [lo, hi]
+    if segment.get("mod"):
+        r, m = segment["mod"]
+        parts.append(f"{key_hash} % {m} = {r}")
+    return (" AND ".join(parts) or "1 = 1"), params
+
+def split_segment(segment, keys, key_hash):
+    # Retorna (expressao do balde, funcao balde -> segmento filho) ou None se nao da para dividir
+    if segment.get("range") and segment["range"][1] > segment["range"][0]:
+        lo, hi = segment["range"]
+        step = -(-(hi - lo + 1) // COMPARE_FANOUT)
+        expr = f"(CAST([{keys[0]}] AS BIGINT) - {lo}) / {step}"
+        return expr, lambda b: {"range": (lo + b * step, min(hi, lo + (b + 1) * step - 1)), "mod": segment.get("mod")}
+    r, m = segment.get("mod") or (0, 1)
+    if m * COMPARE_FANOUT > COMPARE_MAX_MODULUS:
+        return None
+    expr = f"{key_hash} % {m * COMPARE_FANOUT} / {m}"
+    return expr, lambda b: {"range": segment.get("range"), "mod": (r + b * m, m * COMPARE_FANOUT)}
+
+def fetch_segment_buckets(conn, table_ref, keys, key_hash, hash_expr, segment, bucket_expr):
+    where, params = build_segment_where(segment, keys, key_hash)
+    # Resumo do balde: contagem + soma de duas fatias de 32 bits do SHA2_256 de cada linha
+    # (soma, nao XOR: linhas repetidas/trocadas nao se anulam)
+    sql = (
+        f"SELECT {bucket_expr}, COUNT_BIG(*), "
+        f"SUM(CAST(CAST(SUBSTRING(jssms_x.jssms_h, 1, 4) AS INT) AS BIGINT)), "
+        f"SUM(CAST(CAST(SUBSTRING(jssms_x.jssms_h, 5, 4) AS INT) AS BIGINT)) "
+        f"FROM {table_ref} CROSS APPLY (SELECT {hash_expr} AS jssms_h) AS jssms_x "
+        f"WHERE {where} GROUP BY {bucket_expr}"
+    )
+    cur = conn.cursor()
+    cur.execute(sql, params)
+    return {int(r[0]): (r[1], r[2], r[3]) for r in cur.fetchall()}
+
+def fetch_segment_row_hashes(conn, table_ref, keys, key_hash, hash_expr, segment):
+    where, params = build_segment_where(segment, keys, key_hash)
+    key_list = ", ".join(f"[{k}]" for k in keys)
+    cur = conn.cursor()
+    cur.execute(f"SELECT {key_list}, {hash_expr} FROM {table_ref} WHERE {where}", params)
+    return {tuple(r[:-1]): r[-1] for r in cur.fetchall()}
+
+def compare_table(origin_conn, dest_conn, schema, table, pool, report=None):
+    # Compara por resumos de hash (SHA2_256) agregados no servidor (as duas pontas em paralelo) e so desce
+    # nos segmentos diferentes; no fim vem chave+hash apenas das folhas divergentes.
+    table_ref = build_table_ref_full(schema, table)
+    result = {
+        "table": f"{schema}.{table}",
+        "status": "ok",
+        "error": "",
+        "segments": 0,
+        "leaves": [],  # (segmento, chaves a copiar)
+        "extra_keys": [],
+        "missing": 0,
+        "extra": 0,
+        "changed": 0,
+        "resynced": 0,
+    }
+    keys = fetch_primary_key(origin_conn, schema, table)
+    if not keys:
+        result["status"] = "sem PK"
+        return result
+    cols = fetch_columns_detail(origin_conn, schema, table)
+    hash_expr = build_row_hash_expr(cols)
+    key_hash = build_key_hash_expr(cols, keys)
+    key_type = next(((c[1] or "").lower() for c in cols if c[0] == keys[0]), "")
+    root = {"range": None, "mod": None}
+    if key_type in COMPARE_INT_TYPES:
+        bounds_sql = f"SELECT MIN([{keys[0]}]), MAX([{keys[0]}]) FROM {table_ref}"
+        bounds = [f.result() for f in (pool.submit(lambda: origin_conn.execute(bounds_sql).fetchone()), pool.submit(lambda: dest_conn.execute(bounds_sql).fetchone()))]
+        values = [v for b in bounds for v in b if v is not None]
+        if not values:
+            return result
+        root["range"] = (int(min(values)), int(max(values)))
+
+    pending = [root]
+    while pending:
+        segment = pending.pop()
+        split = split_segment(segment, keys, key_hash)
+        result["segments"] += 1
+        if report:
+            report(result)
+        if split is None or segment.get("count", COMPARE_LEAF_ROWS + 1) <= COMPARE_LEAF_ROWS:
+            origin_f = pool.submit(fetch_segment_row_hashes, origin_conn, table_ref, keys, key_hash, hash_expr, segment)
+            dest_f = pool.submit(fetch_segment_row_hashes, dest_conn, table_ref, keys, key_hash, hash_expr, segment)
+            origin_rows, dest_rows = origin_f.result(), dest_f.result()
+            copy_keys = set()
+            for key, h in origin_rows.items():
+                if key not in dest_rows:
+                    result["missing"] += 1
+                    copy_keys.add(key)
+                elif dest_rows[key] != h:
+                    result["changed"] += 1
+                    copy_keys.add(key)
+            extra = [k for k in dest_rows if k not in origin_rows]
+            result["extra"] += len(extra)
+            result["extra_keys"] += extra
+            if copy_keys:
+                result["leaves"].append((segment, copy_keys))
+            continue
+        bucket_expr, child = split
+        origin_f = pool.submit(fetch_segment_buckets, origin_conn, table_ref, keys, key_hash, hash_expr, segment, bucket_expr)
+        dest_f = pool.submit(fetch_segment_buckets, dest_conn, table_ref, keys, key_hash, hash_expr, segment, bucket_expr)
+        origin_buckets, dest_buckets = origin_f.result(), dest_f.result()
+        for b in set(origin_buckets) | set(dest_buckets):
+            o = origin_buckets.get(b)
+            d = dest_buckets.get(b)
+            if o == d:
+                continue
+            sub = child(b)
+            sub["count"] = max(o[0] if o else 0, d[0] if d else 0)
+            pending.append(sub)
+    if result["missing"] or result["extra"] or result["changed"]:
+        result["status"] = "diferente"
+    return result
+
+def resync_table(origin_conn, dest_conn, schema, table, result, batch_size=1000):
+    # Copia so as linhas divergentes: upsert via #stage + MERGE e exclusao das sobras
+    table_ref = build_table_ref_full(schema, table)
+    keys = fetch_primary_key(origin_conn, schema, table)
+    cols = fetch_columns_detail(origin_conn, schema, table)
+    col_names, select_exprs, param_wrappers = build_mirror_select(cols)
+    key_pos = [col_names.index(k) for k in keys]
+    identity_cols = [c[0] for c in cols if c[6] and not c[7]]
+    key_cols = sorted((c for c in cols if c[0] in keys), key=lambda c: keys.index(c[0]))
+    key_hash = build_key_hash_expr(cols, keys)
+    stage = "#jssms_stage"
+    keys_stage = "#jssms_keys"
+    copied = 0
+    try:
+        if result["leaves"]:
+            create_stage_table(dest_conn, stage, cols)
+            write = make_row_writer(dest_conn, build_insert_into(stage, col_names, param_wrappers), cols)
+            for segment, copy_keys in result["leaves"]:
+                where, params = build_segment_where(segment, keys, key_hash)
+                cur = origin_conn.cursor()
+                cur.execute(f"SELECT {', '.join(select_exprs)} FROM {table_ref} WHERE {where}", params)
+                while True:
+                    rows = cur.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    rows = [r for r in rows if tuple(r[i] for i in key_pos) in copy_keys]
+                    if rows:
+                        write(rows)
+                        copied += len(rows)
+            if copied:
+                if identity_cols:
+                    dest_conn.execute(f"SET IDENTITY_INSERT {table_ref} ON")
+                try:
+                    dest_conn.execute(build_merge_sql(table_ref, stage, col_names, keys, identity_cols))
+                finally:
+                    if identity_cols:
+                        dest_conn.execute(f"SET IDENTITY_INSERT {table_ref} OFF")
+        # nunca apaga uma chave que esta mesma ressincronizacao acabou de copiar
+        copied_keys = set().union(*(k for _, k in result["leaves"]))
+        extra = [k for k in result["extra_keys"] if k not in copied_keys]
+        if extra:
+            create_stage_table(dest_conn, keys_stage, key_cols)
+            write = make_row_writer(dest_conn, build_insert_into(keys_stage, keys), key_cols)
+            for i in range(0, len(extra), batch_size):
+                write(extra[i : i + batch_size])
+            dest_conn.execute(build_delete_by_keys_sql(table_ref, keys_stage, keys))
+    finally:
+        drop_stage_table(dest_conn, stage)
+        drop_stage_table(dest_conn, keys_stage)
+    result["resynced"] = copied + len(extra)
+    return result["resynced"]
+
+def compare_tables(stdscr, origin_conn, dest_conn, origin_db, dest_db, tables, origin_label, dest_label, progress_cb=None):
+    try:
+        origin_conn.execute(f"USE [{origin_db}]")
+        dest_conn.execute(f"USE [{dest_db}]")
+    except Exception as e:
+        screen_message(stdscr, "Erro", str(e))
+        return None
+    results = []
+    total = len(tables)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        for idx, t in enumerate(tables, start=1):
+            schema, table = split_table_name(t)
+
+            def report(result, idx=idx):
+                status = f"{t} | segmentos: {result['segments']} | faltando: {result['missing']} | sobrando: {result['extra']} | diferentes: {result['changed']}"
+                if progress_cb:
+                    progress_cb(status, idx, total)
+                else:
+                    screen_message(stdscr, "Comparando tabelas", f"Tabela {idx}/{total}\n{status}", pause=False)
+                    stdscr.refresh()
+
+            try:
+                results.append(compare_table(origin_conn, dest_conn, schema, table, pool, report))
+            except Exception as e:
+                log_event(f"Falha ao comparar {t}: {e}")
+                results.append({"table": t, "status": "erro", "error": str(e), "segments": 0, "leaves": [], "extra_keys": [], "missing": 0, "extra": 0, "changed": 0, "resynced": 0})
+    return results
+
+def screen_compare_report(stdscr, results, origin_label, dest_label):
+    # Retorna True se o usuario pediu a ressincronizacao das diferencas
+    diffs = sum(r["missing"] + r["extra"] + r["changed"] for r in results)
+    scroll = 0
+    while True:
+        stdscr.clear()
+        draw_header(stdscr, "Comparacao Origem x Destino")
         h, w = stdscr.getmaxyx()
-        max_lines = h - 4
-        start = 0
-        if idx >= max_lines:
-            start = idx - max_lines + 1
-        for i, item in enumerate(items[start : start + max_lines]):
-            y = 2 + i
-            attr = curses.A_REVERSE if (start + i) == idx else 0
-            safe_addstr(stdscr, y, 2, str(item)[: w - 4], attr)
+        safe_addstr(stdscr, 2, 2, f"Origem: {origin_label} | Destino: {dest_label}"[: w - 4])
+        safe_addstr(stdscr, 3, 2, f"Tabelas: {len(results)} | Linhas divergentes: {diffs}"[: w - 4])
+        header = f"{'Tabela':<40} {'Status':<10} {'Faltando':>9} {'Sobrando':>9} {'Diferentes':>10} {'Segmentos':>9}"
+        safe_addstr(stdscr, 5, 2, header[: w - 4], curses.A_BOLD)
+        max_rows = max(1, h - 9)
+        scroll = max(0, min(scroll, len(results) - max_rows))
+        for i, r in enumerate(results[scroll : scroll + max_rows]):
+            line = f"{r['table'][:40]:<40} {r['status']:<10} {r['missing']:>9} {r['extra']:>9} {r['changed']:>10} {r['segments']:>9}"
+            if r["error"]:
+                line += f"  {r['error']}"
+            safe_addstr(stdscr, 6 + i, 2, line[: w - 4])
+        footer = "Enter = Ressincronizar diferencas | Setas = rolar | ESC = Voltar" if diffs else "Setas = rolar | ESC/Enter = Voltar"
         safe_addstr(stdscr, h - 2, 2, footer[: w - 4])
         stdscr.refresh()
         ch = stdscr.getch()
         if ch in (27,):
-            return None
+            return False
+        if ch in (curses.KEY_ENTER, 10, 13):
+            return bool(diffs)
         if ch in (curses.KEY_UP,):
-            idx = (idx - 1) % len(items)
+            scroll -= 1
         elif ch in (curses.KEY_DOWN,):
-            idx = (idx + 1) % len(items)
-        elif ch in (curses.KEY_ENTER, 10, 13):
-            return items[idx]
+            scroll += 1
 
-def screen_select_multi(stdscr, title, items):
-    if not items:
-        screen_message(stdscr, title, "Nenhum item encontrado.")
-        return None
-    selected = [False] * len(items)
-    idx = 0
+def resync_tables(stdscr, origin_conn, dest_conn, results):
+    failures = []
+    pending = [r for r in results if r["leaves"] or r["extra_keys"]]
+    for idx, result in enumerate(pending, start=1):
+        screen_message(stdscr, "Ressincronizando", f"Tabela {idx}/{len(pending)}: {result['table']}", pause=False)
+        stdscr.refresh()
+        try:
+            resync_table(origin_conn, dest_conn, *split_table_name(result["table"]), result)
+        except Exception as e:
+            log_event(f"Falha ao ressincronizar {result['table']}: {e}")
+            failures.append((result["table"], str(e)))
+    return failures
+
+DEFAULT_MIRROR_THROUGHPUT = 10 * 1024 * 1024  # bytes/s quando nao ha historico
+
+def format_bytes(n):
+    n = float(n or 0)
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(n) < 1024:
+            return f"{n:.1f} {unit}" if unit != "B" else f"{int(n)} B"
+        n /= 1024
+    return f"{n:.1f} TB"
+
+def estimate_mirror_throughput(origin_label, dest_label):
+    # mediana das ultimas execucoes, preferindo o mesmo par origem/destino
+    runs = [r for r in load_mirror_stats() if r.get("seconds") and r.get("bytes")]
+    same = [r for r in runs if r.get("origin") == origin_label and r.get("dest") == dest_label]
+    sample = (same or runs)[-10:]
+    if not sample:
+        return DEFAULT_MIRROR_THROUGHPUT, 0
+    rates = sorted(r["bytes"] / r["seconds"] for r in sample)
+    return rates[len(rates) // 2], len(sample)
+
+def build_mirror_plan(origin_conn, dest_conn, origin_db, dest_db, tables, options, origin_label, dest_label):
+    origin_conn.execute(f"USE [{origin_db}]")
+    dest_conn.execute(f"USE [{dest_db}]")
+    try:
+        origin_sizes = fetch_table_sizes(origin_conn)
+    except Exception as e:
+        log_event(f"Planejador: tamanhos da origem indisponiveis: {e}")
+        origin_sizes = {}
+    dest_sizes = fetch_table_sizes(dest_conn)
+    origin_cols = fetch_all_column_names(origin_conn)
+    dest_cols = fetch_all_column_names(dest_conn)
+    sync_state = load_mirror_state() if options.get("incremental") else {}
+    rows = []
+    transfer_bytes = 0
+    new_space_kb = 0
+    for t in tables:
+        size = origin_sizes.get(t, {})
+        data_bytes = (size.get("data_kb", 0) + size.get("lob_kb", 0)) * 1024
+        flags = []
+        action = "criar"
+        filt = (options.get("filters") or {}).get(t)
+        if filt:
+            # o tamanho real do subconjunto so e conhecido na copia
+            flags.append(f"filtro: {format_table_filter(filt)}")
+        if t in dest_sizes:
+            dest_rows = dest_sizes[t]["rows"]
+            missing = origin_cols.get(t, set()) - dest_cols.get(t, set())
+            if missing:
+                flags.append(f"CONFLITO: faltam {len(missing)} coluna(s) no destino")
+            incremental = options.get("incremental") and not filt
+            key = mirror_state_key(origin_label, origin_db, dest_label, dest_db, t)
+            if options.get("swap_load") and not options.get("copy_indexes"):
+                flags.append("troca exige copia de indices: carga direta")
+            if incremental and key in sync_state:
+                action = "delta"
+                data_bytes = 0
+            elif options.get("swap_load") and options.get("copy_indexes"):
+                # carga numa tabela nova e troca no final; a atual segue legivel
+                action = "trocar"
+            elif options.get("incremental") and dest_rows:
+                # sem delta (ou com filtro) a copia completa parte da tabela vazia
+                action = "esvaziar"
+                flags.append(f"sera esvaziada ({dest_rows} linhas)")
+            elif dest_rows:
+                action = "acrescentar"
+                flags.append(f"ja tem {dest_rows} linhas (duplicidade/conflito de PK)")
+        else:
+            new_space_kb += size.get("reserved_kb", 0)
+        transfer_bytes += data_bytes
+        rows.append(
+            {
+                "table": t,
+                "rows": size.get("rows", 0),
+                "data_kb": size.get("data_kb", 0),
+                "lob_kb": size.get("lob_kb", 0),
+                "action": action,
+                "flags": flags,
+            }
+        )
+    rows.sort(key=lambda r: r["data_kb"] + r["lob_kb"], reverse=True)
+    throughput, samples = estimate_mirror_throughput(origin_label, dest_label)
+    return {
+        "tables": rows,
+        "transfer_bytes": transfer_bytes,
+        "new_space_kb": new_space_kb,
+        "free_kb": fetch_free_space_kb(dest_conn),
+        "throughput": throughput,
+        "samples": samples,
+        "seconds": transfer_bytes / throughput if throughput else 0,
+    }
+
+def screen_mirror_plan(stdscr, plan, header_lines):
+    scroll = 0
     while True:
         stdscr.clear()
-        draw_header(stdscr, title)
+        draw_header(stdscr, "Planejamento do Espelhamento")
         h, w = stdscr.getmaxyx()
-        max_lines = h - 4
-        start = 0
-        if idx >= max_lines:
-            start = idx - max_lines + 1
-        for i, item in enumerate(items[start : start + max_lines]):
-            idx_abs = start + i
-            mark = "[x]" if selected[idx_abs] else "[ ]"
-            line = f"{mark} {item}"
-            attr = curses.A_REVERSE if idx_abs == idx else 0
-            safe_addstr(stdscr, 2 + i, 2, line[: w - 4], attr)
-        safe_addstr(stdscr, h - 2, 2, "Espaco = marcar | Enter = confirmar | ESC = voltar")
+        basis = f"{plan['samples']} execucao(oes) anteriores" if plan["samples"] else "sem historico, valor padrao"
+        lines = list(header_lines) + [
+            f"Transferencia estimada: {format_bytes(plan['transfer_bytes'])}"
+            f" | Duracao estimada: {format_duration(plan['seconds'])}"
+            f" ({format_bytes(plan['throughput'])}/s, {basis})",
+        ]
+        space = f"Espaco para tabelas novas: {format_bytes(plan['new_space_kb'] * 1024)}"
+        if plan["free_kb"] is not None:
+            space += f" | Livre nos arquivos do destino: {format_bytes(plan['free_kb'] * 1024)}"
+            if plan["new_space_kb"] > plan["free_kb"]:
+                space += " (vai depender de autogrowth)"
+        lines.append(space)
+        flagged = sum(1 for r in plan["tables"] if r["flags"])
+        if flagged:
+            lines.append(f"ATENCAO: {flagged} tabela(s) com alerta.")
+        lines.append("")
+        for i, line in enumerate(lines):
+            safe_addstr(stdscr, 2 + i, 2, line[: w - 4], curses.A_BOLD if line.startswith("ATENCAO") else 0)
+        list_y = 2 + len(lines)
+        header = f"{'Tabela':<40} {'Linhas':>12} {'Dados':>10} {'LOB':>10}  Acao"
+        safe_addstr(stdscr, list_y, 2, header[: w - 4], curses.A_BOLD)
+        max_rows = max(1, h - list_y - 3)
+        scroll = max(0, min(scroll, len(plan["tables"]) - max_rows))
+        for i, r in enumerate(plan["tables"][scroll : scroll + max_rows]):
+            line = (
+                f"{r['table'][:40]:<40} {r['rows']:>12} {format_bytes(r['data_kb'] * 1024):>10}"
+                f" {format_bytes(r['lob_kb'] * 1024):>10}  {r['action']}"
+            )
+            if r["flags"]:
+                line += " | " + "; ".join(r["flags"])
+            safe_addstr(stdscr, list_y + 1 + i, 2, line[: w - 4], curses.A_REVERSE if r["flags"] else 0)
+        safe_addstr(stdscr, h - 2, 2, "Enter = Iniciar | Setas/PgUp/PgDn = rolar | ESC = Cancelar")
         stdscr.refresh()
         ch = stdscr.getch()
         if ch in (27,):
-            return None
+            return False
+        if ch in (curses.KEY_ENTER, 10, 13):
+            return True
         if ch in (curses.KEY_UP,):
-            idx = (idx - 1) % len(items)
+            scroll -= 1
         elif ch in (curses.KEY_DOWN,):
-            idx = (idx + 1) % len(items)
-        elif ch in (ord(" "),):
-            selected[idx] = not selected[idx]
-        elif ch in (curses.KEY_ENTER, 10, 13):
-            chosen = [items[i] for i, flag in enumerate(selected) if flag]
-            if chosen:
-                return chosen
-
-def screen_confirm(stdscr, title, message):
-    stdscr.clear()
-    draw_header(stdscr, title)
-    h, w = stdscr.getmaxyx()
-    lines = message.splitlines()
-    for i, line in enumerate(lines[: h - 4]):
-        safe_addstr(stdscr, 2 + i, 2, line[: w - 4])
-    safe_addstr(stdscr, h - 2, 2, "Enter = Iniciar | ESC = Cancelar")
-    stdscr.refresh()
+            scroll += 1
+        elif ch in (curses.KEY_PPAGE,):
+            scroll -= max_rows
+        elif ch in (curses.KEY_NPAGE,):
+            scroll += max_rows
+
+MIRROR_REPORT_COLUMNS = [
+    ("Tabela", "table"),
+    ("Linhas", "rows"),
+    ("Tempo", "seconds"),
+    ("Origem s", "fetch_seconds"),
+    ("Destino s", "insert_seconds"),
+    ("Linhas/s", "rows_per_s"),
+    ("MB/s", "bytes_per_s"),
+    ("Lotes", "batches"),
+    ("Retries", "retries"),
+]
+
+def mirror_bottleneck(record):
+    # quem fez o outro lado esperar mais e o gargalo
+    if record["wait_origin_seconds"] > record["wait_dest_seconds"]:
+        return "origem"
+    if record["wait_dest_seconds"] > record["wait_origin_seconds"]:
+        return "destino"
+    return "-"
+
+def screen_mirror_report(stdscr, records):
+    sort_idx = 2
+    scroll = 0
     while True:
+        key = MIRROR_REPORT_COLUMNS[sort_idx][1]
+        rows = sorted(records, key=lambda r: r[key], reverse=key != "table")
+        stdscr.clear()
+        draw_header(stdscr, "Espelhamento - Tempo por tabela")
+        h, w = stdscr.getmaxyx()
+        total_rows = sum(r["rows"] for r in records)
+        total_s = sum(r["seconds"] for r in records)
+        fetch_s = sum(r["fetch_seconds"] for r in records)
+        insert_s = sum(r["insert_seconds"] for r in records)
+        safe_addstr(stdscr, 2, 2, f"Tabelas: {len(records)} | Linhas: {total_rows} | Soma dos tempos: {format_duration(total_s)} | Origem: {fetch_s:.1f}s | Destino: {insert_s:.1f}s"[: w - 4])
+        safe_addstr(stdscr, 3, 2, f"Metricas em: {MIRROR_METRICS_PATH}"[: w - 4])
+        header = f"{'Tabela':<32} {'Linhas':>10} {'Tempo':>8} {'Origem s':>9} {'Destino s':>9} {'Linhas/s':>9} {'MB/s':>7} {'Lotes':>6} {'Retries':>7}  Gargalo"
+        safe_addstr(stdscr, 5, 2, header[: w - 4], curses.A_BOLD)
+        max_rows = max(1, h - 9)
+        scroll = max(0, min(scroll, len(rows) - max_rows))
+        for i, r in enumerate(rows[scroll : scroll + max_rows]):
+            line = (
+                f"{r['table'][:32]:<32} {r['rows']:>10} {format_duration(r['seconds']):>8} {r['fetch_seconds']:>9.1f}"
+                f" {r['insert_seconds']:>9.1f} {r['rows_per_s']:>9.0f} {r['bytes_per_s'] / (1024 * 1024):>7.1f}"
+                f" {r['batches']:>6} {r['retries']:>7}  {mirror_bottleneck(r)}"
+            )
+            if r["status"] != "ok":
+                line += " (ERRO)"
+            safe_addstr(stdscr, 6 + i, 2, line[: w - 4])
+        safe_addstr(stdscr, h - 2, 2, f"S = ordenar ({MIRROR_REPORT_COLUMNS[sort_idx][0]}) | Setas = rolar | Enter/ESC = continuar"[: w - 4])
+        stdscr.refresh()
         ch = stdscr.getch()
-        if ch in (27,):
-            return False
-        if ch in (curses.KEY_ENTER, 10, 13):
-            return True
-
-def draw_advanced_layout(stdscr, state, progress=None):
-    stdscr.clear()
-    draw_header(stdscr, f"Jupyter-SSMS {VERSION} - Modo Avançado")
-    h, w = stdscr.getmaxyx()
-    if h < 20 or w < 80:
-        screen_message(stdscr, "Erro", "Terminal muito pequeno. Use ao menos 80x20.")
-        return
-    top = 2
-    toolbar = "F5 Iniciar | O=Origem | D=Destino | B=DBs | T=Tabelas | M=Modo | ESC Voltar"
-    safe_addstr(stdscr, top, 2, toolbar[: w - 4])
-
-    left_w = max(26, min(40, w // 3))
-    content_top = top + 1
-    content_bottom = h - 2
-    content_h = max(6, content_bottom - content_top)
-
-    right_x = left_w + 1
-    right_w = max(10, w - right_x - 1)
-    editor_h = max(6, content_h // 2)
-    result_h = max(4, content_h - editor_h - 1)
-
-    for y in range(content_top, content_top + content_h):
-        safe_addstr(stdscr, y, left_w, "|")
-
-    # Left panel
-    left_win = panel_window(stdscr, content_top, 1, content_h, left_w, "Ações", focused=True)
-    safe_addstr(left_win, 1, 2, "Espelhar Banco")
+        if ch in (27, curses.KEY_ENTER, 10, 13):
+            return
+        if ch in (ord("s"), ord("S")):
+            sort_idx = (sort_idx + 1) % len(MIRROR_REPORT_COLUMNS)
+            scroll = 0
+        elif ch in (curses.KEY_UP,):
+            scroll -= 1
+        elif ch in (curses.KEY_DOWN,):
+            scroll += 1
 
-    # Right top - config
-    cfg_win = panel_window(stdscr, content_top, right_x, editor_h, right_w, "Espelho")
+def format_log_report(log_stats, after):
+    mb = 1024 * 1024
+    used_before, size_before = log_stats["before"]
+    size_after = after[1] if after else size_before
+    recovery = log_stats.get("recovery") or "-"
     lines = [
-        f"Origem:  {state.get('origin_label','-')}",
-        f"Destino: {state.get('dest_label','-')}",
-        f"DB Origem:  {state.get('origin_db','-')}",
-        f"DB Destino: {state.get('dest_db','-')}",
-        f"Modo: {state.get('mode','Database inteiro')}",
-        f"Tabelas: {state.get('tables_label','-')}",
-        "",
-        "Atalhos: O=Origem  D=Destino  B=DBs",
-        "         M=Modo    T=Tabelas  F5=Iniciar",
+        f"Recovery model: {recovery}",
+        f"Tamanho do log: {size_before / mb:.1f} MB -> {size_after / mb:.1f} MB (crescimento {(size_after - size_before) / mb:.1f} MB)",
+        f"Pico de uso do log: {log_stats.get('peak_used', used_before) / mb:.1f} MB",
     ]
-    max_lines = editor_h - 2
-    for i, line in enumerate(lines[:max_lines]):
-        safe_addstr(cfg_win, 1 + i, 2, line[: right_w - 4])
-
-    # Right bottom - progress
-    prog_win = panel_window(stdscr, content_top + editor_h + 1, right_x, result_h, right_w, "Progresso")
-    if progress:
-        safe_addstr(prog_win, 1, 2, "NÃO FECHAR O APP ATÉ FINALIZAR")
-        safe_addstr(prog_win, 2, 2, f"Tabela {progress['idx']}/{progress['total']}: {progress['table']}"[: right_w - 4])
-        total = progress["rows_total"]
-        copied = progress["rows_copied"]
-        percent = int((copied / total) * 100) if total else 0
-        bar_w = max(10, right_w - 6)
-        filled = int((percent / 100) * bar_w)
-        bar = "[" + "#" * filled + "-" * (bar_w - filled) + "]"
-        safe_addstr(prog_win, 4, 2, bar[: right_w - 4])
-        safe_addstr(prog_win, 5, 2, f"{copied}/{total} linhas ({percent}%)"[: right_w - 4])
-    else:
-        safe_addstr(prog_win, 1, 2, "Sem progresso ainda.")
-
-    stdscr.refresh()
-    left_win.refresh()
-    cfg_win.refresh()
-    prog_win.refresh()
-
-def render_progress(stdscr, title, origin_label, dest_label, table_name, table_idx, table_total, copied, total):
-    stdscr.clear()
-    draw_header(stdscr, title)
-    h, w = stdscr.getmaxyx()
-    safe_addstr(stdscr, 2, 2, "NÃO FECHAR O APP ATÉ FINALIZAR")
-    safe_addstr(stdscr, 4, 2, f"Origem: {origin_label}"[: w - 4])
-    safe_addstr(stdscr, 5, 2, f"Destino: {dest_label}"[: w - 4])
-    safe_addstr(stdscr, 7, 2, f"Tabela {table_idx}/{table_total}: {table_name}"[: w - 4])
-    if total > 0:
-        percent = int((copied / total) * 100)
-    else:
-        percent = 0
-    bar_w = max(10, w - 10)
-    filled = int((percent / 100) * bar_w)
-    bar = "[" + "#" * filled + "-" * (bar_w - filled) + "]"
-    safe_addstr(stdscr, 9, 2, bar[: w - 4])
-    safe_addstr(stdscr, 10, 2, f"{copied}/{total} linhas ({percent}%)"[: w - 4])
-    stdscr.refresh()
+    if recovery == "FULL":
+        lines.append("Recovery FULL: a carga e totalmente logada (sem minimal logging).")
+    log_event("Carga bulk: " + " | ".join(lines))
+    return lines
 
-def mirror_tables(stdscr, origin_conn, dest_conn, origin_db, dest_db, tables, origin_label, dest_label, progress_cb=None):
-    try:
-        origin_conn.execute(f"USE [{origin_db}]")
-        dest_conn.execute(f"USE [{dest_db}]")
-    except Exception as e:
-        screen_message(stdscr, "Erro", str(e))
-        return False
-    total_tables = len(tables)
-    batch_size = 1000
-    for idx, t in enumerate(tables, start=1):
-        schema, table = split_table_name(t)
-        try:
-            cols = fetch_columns_detail(origin_conn, schema, table)
-            col_names = [c[0] for c in cols if not c[7]]
-            if not col_names:
-                continue
-            select_exprs = []
-            param_wrappers = []
-            for col in cols:
-                name, data_type, *_ = col
-                if col[7]:
-                    continue
-                dt = (data_type or "").lower()
-                if dt == "sql_variant":
-                    select_exprs.append(f"CONVERT(NVARCHAR(MAX), [{name}]) AS [{name}]")
-                    param_wrappers.append("CONVERT(sql_variant, ?)")
-                elif dt == "xml":
-                    select_exprs.append(f"CONVERT(NVARCHAR(MAX), [{name}]) AS [{name}]")
-                    param_wrappers.append("CONVERT(xml, ?)")
-                else:
-                    select_exprs.append(f"[{name}]")
-                    param_wrappers.append("?")
-            select_cols = ", ".join(select_exprs)
-            select_sql = f"SELECT {select_cols} FROM {build_table_ref_full(schema, table)}"
-            if not table_exists(dest_conn, schema, table):
-                created = create_table_from_columns(dest_conn, schema, table, cols)
-                if not created:
-                    screen_message(stdscr, "Erro", f"{schema}.{table}\nFalha ao criar tabela no destino.")
-                    return False
-            insert_sql = build_insert_sql(schema, table, col_names, param_wrappers)
-            try:
-                total = origin_conn.execute(f"SELECT COUNT(*) FROM {build_table_ref_full(schema, table)}").fetchone()[0]
-            except Exception:
-                total = 0
-            copied = 0
-            cur = origin_conn.cursor()
-            cur.execute(select_sql)
-            dest_cur = dest_conn.cursor()
-            try:
-                dest_cur.fast_executemany = True
-            except Exception:
-                pass
-            has_identity = any(c[6] for c in cols if not c[7])
-            if has_identity:
-                dest_conn.execute(f"SET IDENTITY_INSERT {build_table_ref_full(schema, table)} ON")
-            if progress_cb:
-                progress_cb(t, idx, total_tables, copied, total)
+def build_post_load_ddl(sink, dest_conn, dest_db, post_load, options, dest_connect=None):
+    # Clustered primeiro (reconstruir o clustered depois refaria os secundarios),
+    # depois os secundarios (em paralelo, se configurado) e por fim checks e FKs.
+    workers = max(1, int(options.get("index_workers") or 1))
+    failures = []
+    phases = [
+        ("Criando indices clustered", post_load["clustered"], workers),
+        ("Criando indices secundarios", post_load["secondary"], workers),
+        ("Criando constraints", post_load["constraints"], 1),
+    ]
+    for label, statements, phase_workers in phases:
+        if not statements:
+            continue
+        sink["status"](f"{label} ({len(statements)})...")
+        failures += run_ddl_statements(dest_conn, statements, phase_workers, dest_connect, dest_db)
+    fk_statements = []
+    for fk, sql in post_load["foreign_keys"]:
+        if table_exists(dest_conn, fk["ref_schema"], fk["ref_table"]):
+            fk_statements.append(sql)
+        else:
+            log_event(f"FK {fk['name']} ignorada: {fk['ref_schema']}.{fk['ref_table']} nao existe no destino")
+    if fk_statements:
+        sink["status"](f"Criando foreign keys ({len(fk_statements)})...")
+        failures += run_ddl_statements(dest_conn, fk_statements)
+    return failures
+
+def screen_mirror_options(stdscr, cfg):
+    options = mirror_options(cfg)
+    fields = MIRROR_OPTION_FIELDS
+    idx = 0
+    while True:
+        stdscr.clear()
+        draw_header(stdscr, "Modo Avançado - Opcoes do Espelhamento")
+        h, w = stdscr.getmaxyx()
+        for i, (label, key, ftype) in enumerate(fields[: h - 5]):
+            if ftype == "bool":
+                val = "ON" if options.get(key) else "OFF"
             else:
-                render_progress(stdscr, "Modo Avançado - Espelhar Banco", origin_label, dest_label, t, idx, total_tables, copied, total)
-            while True:
-                rows = cur.fetchmany(batch_size)
-                if not rows:
-                    break
-                dest_cur.executemany(insert_sql, rows)
-                copied += len(rows)
-                if progress_cb:
-                    progress_cb(t, idx, total_tables, copied, total)
-                else:
-                    render_progress(stdscr, "Modo Avançado - Espelhar Banco", origin_label, dest_label, t, idx, total_tables, copied, total)
-            if has_identity:
-                dest_conn.execute(f"SET IDENTITY_INSERT {build_table_ref_full(schema, table)} OFF")
-        except Exception as e:
-            screen_message(stdscr, "Erro", f"{t}\n{e}")
-            return False
-    return True
-
-def screen_advanced(stdscr, cfg, current, conn):
+                val = str(options.get(key, ""))
+            attr = curses.A_REVERSE if i == idx else 0
+            safe_addstr(stdscr, 3 + i, 4, f"{label}: {val}"[: w - 6], attr)
+        safe_addstr(stdscr, h - 2, 2, "ESPACO = toggle/alternar | Digite numeros nos campos | Enter/ESC = salvar e voltar")
+        stdscr.refresh()
+        ch = stdscr.getch()
+        if ch in (27, curses.KEY_ENTER, 10, 13):
+            cfg["mirror"] = options
+            save_config(cfg)
+            return options
+        if ch in (curses.KEY_UP,):
+            idx = (idx - 1) % len(fields)
+            continue
+        if ch in (curses.KEY_DOWN,):
+            idx = (idx + 1) % len(fields)
+            continue
+        label, key, ftype = fields[idx]
+        if ftype == "bool" and ch in (ord(" "),):
+            options[key] = not bool(options.get(key))
+        elif ftype == "choice" and ch in (ord(" "),):
+            choices = MIRROR_OPTION_CHOICES[key]
+            current = options.get(key)
+            options[key] = choices[(choices.index(current) + 1) % len(choices) if current in choices else 0]
+        elif ftype == "int":
+            val = str(options.get(key, 0) or "")
+            if ch in (curses.KEY_BACKSPACE, 127, 8):
+                val = val[:-1]
+            elif ord("0") <= ch <= ord("9"):
+                val = (val + chr(ch)).lstrip("0")
+            options[key] = int(val or 0)
+
+def screen_advanced(stdscr, cfg, current, conn, password=None):
     origin_conn = conn
+    origin_connect = None
+    if password is not None:
+        origin_cfg = dict(cfg)
+        origin_cfg.update(current)
+        origin_connect = lambda: connect_db(origin_cfg, password)
     origin_label = f"{current.get('user','')}@{current.get('host','')}:{current.get('port','')}"
     origin_current_db = current.get("database") or "master"
     dest_conn = None
+    dest_connect = None
     dest_label = "Sem conexao"
     dest_current_db = "master"
     origin_dbs = []
@@ -2124,6 +5487,7 @@ def screen_advanced(stdscr, cfg, current, conn):
     dest_idx = 0
     focus = "origin"
     selected_tables = set()  # (db, table)
+    table_filters = {}  # tabela -> {"where", "top", "sample"} (database selecionado)
     selected_origin_db = None
     selected_dest_db = None
 
@@ -2168,7 +5532,7 @@ def screen_advanced(stdscr, cfg, current, conn):
             screen_message(stdscr, "Erro", "Terminal muito pequeno. Use ao menos 80x20.")
             return
         top = 2
-        toolbar = "F2 Conectar | TAB Alternar foco | F5 Iniciar | ESPACO Selecionar | ESC Voltar"
+        toolbar = "F2 Conectar | TAB Alternar foco | F3 Opcoes | F4 Filtro | F5 Iniciar | F6 Comparar | ESPACO Selecionar | ESC Voltar"
         safe_addstr(stdscr, top, 2, toolbar[: w - 4])
 
         content_top = top + 1
@@ -2206,6 +5570,8 @@ def screen_advanced(stdscr, cfg, current, conn):
             if item["type"] == "table":
                 key = (item["db"], item["table"])
                 marker = "[x]" if key in selected_tables else "[ ]"
+                if key in selected_tables and table_filters.get(item["table"]):
+                    marker += " (F)"
             if item["type"] == "db" and selected_origin_db == item.get("db"):
                 marker = "=>"
             label = f"{'  ' * depth}{prefix} {marker} {item['label']}".strip()
@@ -2295,11 +5661,13 @@ def screen_advanced(stdscr, cfg, current, conn):
                 continue
             if focus == "origin":
                 origin_conn = new_conn
+                origin_connect = lambda conn_cfg=conn_cfg, pwd=pwd2: connect_db(conn_cfg, pwd)
                 origin_label = f"{cur2.get('user','')}@{cur2.get('host','')}:{cur2.get('port','')}"
                 origin_current_db = cur2.get("database") or "master"
                 reset_origin_state()
                 selected_tables.clear()
                 selected_origin_db = None
+                table_filters.clear()
             else:
                 if dest_conn:
                     try:
@@ -2307,6 +5675,7 @@ def screen_advanced(stdscr, cfg, current, conn):
                     except Exception:
                         pass
                 dest_conn = new_conn
+                dest_connect = lambda conn_cfg=conn_cfg, pwd=pwd2: connect_db(conn_cfg, pwd)
                 dest_label = f"{cur2.get('user','')}@{cur2.get('host','')}:{cur2.get('port','')}"
                 dest_current_db = cur2.get("database") or "master"
                 reset_dest_state()
@@ -2316,6 +5685,9 @@ def screen_advanced(stdscr, cfg, current, conn):
             reset_origin_state()
             reset_dest_state()
             continue
+        if ch == curses.KEY_F3:
+            screen_mirror_options(stdscr, cfg)
+            continue
         if ch == curses.KEY_F5:
             if not dest_conn:
                 screen_message(stdscr, "Erro", "Conecte o destino.")
@@ -2328,22 +5700,27 @@ def screen_advanced(stdscr, cfg, current, conn):
                 continue
             origin_db = selected_origin_db
             tables = [t for (_, t) in sorted(selected_tables)]
-            confirm = screen_confirm(
-                stdscr,
-                "Confirmar Espelhamento",
-                "\n".join(
-                    [
-                        f"Origem: {origin_label} / {origin_db}",
-                        f"Destino: {dest_label} / {selected_dest_db}",
-                        f"Tabelas: {len(tables)}",
-                        "",
-                        "NÃO FECHAR O APP ATÉ FINALIZAR.",
-                    ]
-                ),
-            )
+            options = mirror_options(cfg)
+            options["filters"] = {t: f for t, f in table_filters.items() if t in tables and f}
+            header_lines = [
+                f"Origem: {origin_label} / {origin_db}",
+                f"Destino: {dest_label} / {selected_dest_db}",
+                f"Tabelas: {len(tables)} | Modo: {'Incremental' if options.get('incremental') else 'Copia completa'}"
+                + (f" | Filtradas: {len(options['filters'])}{' (seguindo FKs)' if options.get('follow_fks') else ''}" if options["filters"] else "")
+                + (f" | Leitura: {options['consistent_reads']}" if options.get("consistent_reads", "off") != "off" else ""),
+                "NÃO FECHAR O APP ATÉ FINALIZAR.",
+            ]
+            screen_message(stdscr, "Planejamento do Espelhamento", "Coletando metadados...", pause=False)
+            stdscr.refresh()
+            try:
+                plan = build_mirror_plan(origin_conn, dest_conn, origin_db, selected_dest_db, tables, options, origin_label, dest_label)
+                confirm = screen_mirror_plan(stdscr, plan, header_lines)
+            except Exception as e:
+                log_event(f"Planejador indisponivel: {e}")
+                confirm = screen_confirm(stdscr, "Confirmar Espelhamento", "\n".join(header_lines))
             if not confirm:
                 continue
-            def progress_cb(t, idx, total, copied, total_rows):
+            def progress_cb(t, idx, total, copied, total_rows, eta=None):
                 nonlocal progress
                 progress = {
                     "table": t,
@@ -2351,9 +5728,11 @@ def screen_advanced(stdscr, cfg, current, conn):
                     "total": total,
                     "rows_copied": copied,
                     "rows_total": total_rows,
+                    "eta": eta,
                 }
+                render_progress(stdscr, "Modo Avançado - Espelhar Banco", origin_label, dest_label, t, idx, total, copied, total_rows, eta=eta)
             ok = mirror_tables(
-                stdscr,
+                curses_mirror_sink(stdscr, origin_label, dest_label, progress_cb),
                 origin_conn,
                 dest_conn,
                 origin_db,
@@ -2361,12 +5740,36 @@ def screen_advanced(stdscr, cfg, current, conn):
                 tables,
                 origin_label,
                 dest_label,
-                progress_cb=progress_cb,
+                options=options,
+                dest_connect=dest_connect,
+                origin_connect=origin_connect,
             )
             progress = None
             if ok:
                 screen_message(stdscr, "Concluido", "Espelhamento finalizado com sucesso.")
             continue
+        if ch == curses.KEY_F6:
+            if not dest_conn:
+                screen_message(stdscr, "Erro", "Conecte o destino.")
+                continue
+            if not selected_tables:
+                screen_message(stdscr, "Erro", "Selecione tabelas na origem (ESPACO).")
+                continue
+            if not selected_dest_db:
+                screen_message(stdscr, "Erro", "Selecione o DB destino (Enter no DB).")
+                continue
+            tables = [t for (_, t) in sorted(selected_tables)]
+            results = compare_tables(stdscr, origin_conn, dest_conn, selected_origin_db, selected_dest_db, tables, origin_label, dest_label)
+            if results is None:
+                continue
+            if screen_compare_report(stdscr, results, origin_label, dest_label):
+                failures = resync_tables(stdscr, origin_conn, dest_conn, results)
+                if failures:
+                    screen_message(stdscr, "Erro", "\n".join(f"{t}: {err}" for t, err in failures))
+                else:
+                    total = sum(r["resynced"] for r in results)
+                    screen_message(stdscr, "Concluido", f"Ressincronizacao finalizada: {total} linha(s) copiada(s)/removida(s).")
+            continue
 
         # navigation
         if focus == "origin":
@@ -2415,6 +5818,16 @@ def screen_advanced(stdscr, cfg, current, conn):
                 selected_origin_db = item["db"]
                 origin_current_db = item["db"]
                 selected_tables.clear()
+                table_filters.clear()
+                continue
+            if ch == curses.KEY_F4 and item["type"] == "table":
+                key = (item["db"], item["table"])
+                if key not in selected_tables:
+                    screen_message(stdscr, "Erro", "Selecione a tabela (ESPACO) antes de filtrar.")
+                    continue
+                filt = screen_table_filter(stdscr, item["table"], table_filters.get(item["table"]))
+                if filt is not None:
+                    table_filters[item["table"]] = filt
                 continue
             if ch in (ord(" "),) and item["type"] == "table":
                 if selected_origin_db and item["db"] != selected_origin_db:
@@ -2660,6 +6073,179 @@ def screen_query(stdscr, conn, initial_sql=""):
         screen_message(stdscr, "Erro", str(e))
 
 
+# Codigos de saida do modo sem interface
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_CONNECT = 3
+EXIT_WARNINGS = 4
+
+def find_history_entry(cfg, name):
+    # Aceita o nome salvo, o rotulo do historico ou user@host:port
+    name = (name or "").strip()
+    for entry in cfg.get("history", []):
+        labels = (
+            entry.get("name", "").strip(),
+            format_history_entry(entry).replace(" [senha]", ""),
+            f"{entry.get('user', '')}@{entry.get('host', '')}:{entry.get('port', '')}",
+        )
+        if name and name in labels:
+            return entry
+    return None
+
+def history_connector(cfg, spec):
+    # spec: {"connection": entrada do historico, "database": ..., "password_env": variavel opcional}
+    entry = find_history_entry(cfg, spec.get("connection"))
+    if entry is None:
+        raise ValueError(f"Conexao nao encontrada no historico: {spec.get('connection')}")
+    if spec.get("password_env"):
+        password = os.environ.get(spec["password_env"], "")
+    else:
+        password = entry.get("password", "")
+    conn_cfg = dict(cfg)
+    conn_cfg.update(entry)
+    label = f"{entry.get('user', '')}@{entry.get('host', '')}:{entry.get('port', '')}"
+    return (lambda: connect_db(conn_cfg, password)), label
+
+def load_mirror_job(path):
+    with open(path, "r", encoding="utf-8") as f:
+        job = json.load(f)
+    for side in ("origin", "dest"):
+        if not isinstance(job.get(side), dict) or not job[side].get("connection") or not job[side].get("database"):
+            raise ValueError(f"'{side}' precisa de 'connection' e 'database'")
+    tables = job.get("tables")
+    if not isinstance(tables, list) or not tables:
+        raise ValueError("'tables' precisa ser uma lista de schema.tabela")
+    return job
+
+def run_mirror_job(path, stream=None):
+    sink = json_mirror_sink(stream)
+    try:
+        job = load_mirror_job(path)
+    except (OSError, ValueError) as e:
+        sink["message"]("Erro", f"Job invalido: {e}", "error")
+        return EXIT_USAGE
+    cfg = load_config()
+    options = mirror_options(cfg)
+    options.update(job.get("options") or {})
+    options["filters"] = job.get("filters") or {}
+    try:
+        origin_connect, origin_label = history_connector(cfg, job["origin"])
+        dest_connect, dest_label = history_connector(cfg, job["dest"])
+    except ValueError as e:
+        sink["message"]("Erro", str(e), "error")
+        return EXIT_USAGE
+    origin_conn, err = origin_connect()
+    if err:
+        sink["message"]("Erro", f"Origem: {err}", "error")
+        return EXIT_CONNECT
+    dest_conn, err = dest_connect()
+    if err:
+        origin_conn.close()
+        sink["message"]("Erro", f"Destino: {err}", "error")
+        return EXIT_CONNECT
+    tables = [t if "." in t else f"dbo.{t}" for t in job["tables"]]
+    sink["status"](f"Espelhando {len(tables)} tabela(s): {origin_label}/{job['origin']['database']} -> {dest_label}/{job['dest']['database']}")
+    try:
+        ok = mirror_tables(
+            sink,
+            origin_conn,
+            dest_conn,
+            job["origin"]["database"],
+            job["dest"]["database"],
+            tables,
+            origin_label,
+            dest_label,
+            options=options,
+            dest_connect=dest_connect,
+            origin_connect=origin_connect,
+        )
+    except Exception as e:
+        log_event("Falha no espelhamento sem interface\n" + traceback.format_exc())
+        sink["message"]("Erro", str(e), "error")
+        ok = False
+    finally:
+        for conn in (origin_conn, dest_conn):
+            try:
+                conn.close()
+            except Exception:
+                pass
+    if not ok:
+        return EXIT_FAILED
+    if "warning" in sink["levels"]:
+        return EXIT_WARNINGS
+    sink["message"]("Concluido", "Espelhamento finalizado com sucesso.")
+    return EXIT_OK
+
+def run_cli(argv):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="sqlserver_cli.py", description=f"Jupyter-SSMS {VERSION} (sem argumentos abre a interface)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    mirror = commands.add_parser("mirror", help="espelhamento sem interface a partir de um job JSON")
+    mirror.add_argument("--job", required=True, help="arquivo JSON com conexoes, tabelas e opcoes")
+    query = commands.add_parser("query", help="executa uma query e escreve o resultado em stdout")
+    query.add_argument("--conn", required=True, help="conexao do historico (nome, rotulo ou user@host:porta)")
+    query.add_argument("-f", "--file", default="-", help="arquivo .sql (padrao: stdin)")
+    query.add_argument("--format", choices=("csv", "jsonl", "tsv"), default="csv")
+    query.add_argument("--delimiter", default=";", help="separador do csv (padrao ;)")
+    query.add_argument("--database", help="banco (padrao: o da conexao salva)")
+    query.add_argument("--password-env", help="variavel de ambiente com a senha (padrao: senha salva)")
+    args = parser.parse_args(argv)
+    if args.command == "mirror":
+        return run_mirror_job(args.job)
+    if args.command == "query":
+        return run_query_command(args)
+    return EXIT_USAGE
+
+def run_query_command(args, stream=None):
+    # Resultado da query em stdout, em streaming (memoria constante, para pipelines)
+    try:
+        if args.file == "-":
+            sql = sys.stdin.read()
+        else:
+            with open(args.file, "r", encoding="utf-8-sig") as f:
+                sql = f.read()
+    except OSError as e:
+        sys.stderr.write(f"Erro lendo a query: {e}\n")
+        return EXIT_USAGE
+    if not sql.strip():
+        sys.stderr.write("Query vazia.\n")
+        return EXIT_USAGE
+    cfg = load_config()
+    try:
+        connect, label = history_connector(cfg, {"connection": args.conn, "password_env": args.password_env})
+    except ValueError as e:
+        sys.stderr.write(f"{e}\n")
+        return EXIT_USAGE
+    conn, err = connect()
+    if err:
+        sys.stderr.write(f"Erro conectando em {label}: {err}\n")
+        return EXIT_CONNECT
+    out = stream or open(sys.stdout.fileno(), "w", encoding="utf-8", newline="", buffering=EXPORT_BUFFER_BYTES, closefd=False)
+    try:
+        if args.database:
+            conn.execute(f"USE [{args.database}]")
+        cur, cols = execute_for_export(conn, sql)
+        if args.format == "jsonl":
+            write_jsonl_stream(out, cur, cols)
+        else:
+            write_csv_stream(out, cur, cols, "\t" if args.format == "tsv" else args.delimiter, lineterminator="\n")
+        out.flush()
+        return EXIT_OK
+    except BrokenPipeError:
+        # leitor fechou o pipe (ex.: | head): encerra sem erro
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return EXIT_OK
+    except Exception as e:
+        sys.stderr.write(f"Erro: {e}\n")
+        return EXIT_FAILED
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
 def app(stdscr):
     safe_curs_set(0)
     safe_start_color()
@@ -2719,7 +6305,7 @@ def app(stdscr):
                 upsert_history(cfg, entry)
 
             while True:
-                action = screen_workspace(stdscr, conn, cfg, current)
+                action = screen_workspace(stdscr, conn, cfg, current, password)
                 if action == "disconnect":
                     try:
                         conn.close()
@@ -2736,7 +6322,17 @@ def app(stdscr):
         safe_noraw()
 
 
+def load_curses():
+    global curses
+    import curses
+    import curses.ascii
+    import curses.textpad
+
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(run_cli(sys.argv[1:]))
+    load_curses()
     try:
         curses.wrapper(app)
     except Exception: